@@ -27,6 +27,13 @@ import os
 import cgi
 import tempfile
 import gc
+import json
+import hashlib
+import struct
+import threading
+import weakref
+import collections
+import time
 
 from gi.repository import RB
 from gi.repository import GObject
@@ -43,12 +50,18 @@ from coverart_utils import SortedCollection
 from coverart_utils import idle_iterator
 from coverart_utils import NaturalString
 import coverart_rb3compat as rb3compat
-from coverart_utils import uniquify_and_sort
+from coverart_search_providers import get_search_providers
 from coverart_utils import dumpstack
 from coverart_utils import check_lastfm
+from coverart_utils import WorkerPool
+from coverart_utils import PixbufCache
 import rb
 
-
+try:
+    import numpy
+except ImportError:
+    # the albums' numeric fields are then only read from the albums
+    numpy = None
 
 
 # default chunk of entries to process when loading albums
@@ -57,44 +70,278 @@ ALBUM_LOAD_CHUNK = 50
 # default chunk of albums to process when loading covers
 COVER_LOAD_CHUNK = 5
 
+# milliseconds without database changes before applying the collected ones,
+# and maximum milliseconds the changes are collected during a long burst
+DB_CHANGES_DELAY = 250
+DB_CHANGES_MAX_DELAY = 5000
+
+# track properties that don't move the track to another album, and the
+# album's fields built from each of them
+TRACK_PROP_FIELDS = {
+    RB.RhythmDBPropType.TITLE: ('track_titles',),
+    RB.RhythmDBPropType.GENRE: ('genres',),
+    RB.RhythmDBPropType.COMPOSER: ('composers',),
+    RB.RhythmDBPropType.DATE: ('year',),
+    RB.RhythmDBPropType.RATING: ('rating',),
+    RB.RhythmDBPropType.DURATION: ('duration',),
+    RB.RhythmDBPropType.TRACK_NUMBER: ('track_order',),
+    RB.RhythmDBPropType.DISC_NUMBER: ('track_order',)
+}
+
+# version of the on-disk album index; bump it whenever its layout changes
+ALBUM_INDEX_VERSION = 1
+
+
+class ThumbnailCache(object):
+    '''
+    Disk cache of scaled covers. Each entry holds the raw pixels of a pixbuf
+    and is keyed by the source image path, its mtime, the scaled size and a
+    variant string describing any other setting that changes the result
+    (e.g. the shadow drawn around the cover). When the cache grows over its
+    size limit, the least recently used entries are evicted.
+
+    It's safe to use it from the cover worker threads.
+
+    :param max_size: `int` maximum size of the cache in bytes.
+    :param folder: `str` folder where the entries are stored. By default it
+        lives on the plugin's cache folder.
+    '''
+    MAGIC = b'CATC'
+    HEADER = struct.Struct('<4sIIIB')
+
+    def __init__(self, max_size, folder=None):
+        if not folder:
+            folder = os.path.join(RB.user_cache_dir(), 'coverart_browser',
+                                  'thumbnails')
+
+        self._folder = folder
+        self._max_size = max_size
+        self._current_size = None
+        self._lock = threading.Lock()
+
+    def _filename(self, image, size, variant):
+        try:
+            mtime = os.stat(image).st_mtime
+        except OSError:
+            return None
+
+        key = '%s\0%r\0%d\0%s' % (image, mtime, size, variant)
+
+        return os.path.join(self._folder,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def load(self, image, size, variant=''):
+        '''
+        Returns the cached pixbuf for the image, or None if there isn't one.
+        '''
+        filename = self._filename(image, size, variant)
+
+        try:
+            with open(filename, 'rb') as entry:
+                data = entry.read()
+
+            # mark the entry as recently used
+            os.utime(filename, None)
+        except (IOError, OSError, TypeError):
+            return None
+
+        if len(data) < self.HEADER.size:
+            return None
+
+        magic, width, height, rowstride, has_alpha = \
+            self.HEADER.unpack_from(data)
+        pixels = data[self.HEADER.size:]
+
+        if magic != self.MAGIC or len(pixels) != rowstride * height:
+            return None
+
+        return GdkPixbuf.Pixbuf.new_from_bytes(
+            GLib.Bytes.new(pixels), GdkPixbuf.Colorspace.RGB,
+            bool(has_alpha), 8, width, height, rowstride)
+
+    def store(self, image, size, pixbuf, variant=''):
+        '''
+        Saves the pixbuf as the scaled version of the image.
+        '''
+        filename = self._filename(image, size, variant)
+
+        if not filename:
+            return
+
+        rowstride = pixbuf.get_rowstride()
+        height = pixbuf.get_height()
+        pixels = pixbuf.get_pixels()
+        # the last row of a pixbuf isn't padded up to the rowstride
+        pixels += b'\0' * (rowstride * height - len(pixels))
+
+        data = self.HEADER.pack(self.MAGIC, pixbuf.get_width(), height,
+                                rowstride, pixbuf.get_has_alpha()) + pixels
+
+        try:
+            if not os.path.exists(self._folder):
+                os.makedirs(self._folder)
+
+            with tempfile.NamedTemporaryFile(mode='wb', dir=self._folder,
+                                             delete=False) as tmp:
+                tmp.write(data)
+
+            os.rename(tmp.name, filename)
+        except (IOError, OSError) as e:
+            print('Error while caching a thumbnail: ' + str(e))
+            return
+
+        with self._lock:
+            if self._current_size is None:
+                self._current_size = sum(size for name, size, mtime in
+                                         self._entries())
+            else:
+                self._current_size += len(data)
+
+            if self._current_size > self._max_size:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+
+        for name in os.listdir(self._folder):
+            try:
+                stat = os.stat(os.path.join(self._folder, name))
+            except OSError:
+                continue
+
+            entries.append((name, stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def _evict(self):
+        # remove the least recently used entries until there's some room
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._current_size = sum(size for name, size, mtime in entries)
+        target = self._max_size * 0.9
+
+        for name, size, mtime in entries:
+            if self._current_size <= target:
+                break
+
+            try:
+                os.remove(os.path.join(self._folder, name))
+                self._current_size -= size
+            except OSError:
+                pass
+
 
 class Cover(GObject.Object):
     '''
     Cover of an Album. It may be initialized either by a file path to the image
     to use or by a previously allocated pixbuf.
 
+    The pixbuf is created when first needed. If a `PixbufCache` is given, the
+    pixbuf is kept there instead of on the cover, so it may be evicted at any
+    moment; it's transparently recreated on the next access. If the cover has
+    a `refill` callable, the recreation is left to it instead: it's called
+    with the cover and returns the pixbuf to show until the cover's one is
+    set again.
+
     :param size: `int` size in pixels of the side of the cover (asuming a
         square-shapped cover).
     :param image: `str` containing a path of an image from where to create
         the cover.
+    :param pixbuf: `GdkPixbuf.Pixbuf` already decoded from image at the given
+        size.
+    :param cache: `PixbufCache` (or a view of it) where to keep the pixbuf.
+    :param thumbnails: `ThumbnailCache` used when recreating the pixbuf.
     '''
     # signals
     __gsignals__ = {
         'resized': (GObject.SIGNAL_RUN_LAST, None, ())
     }
 
-    def __init__(self, size, image):
+    def __init__(self, size, image, pixbuf=None, cache=None, thumbnails=None):
         super(Cover, self).__init__()
 
         assert isinstance(image, str), "image should be a string"
 
         self.original = image
+        self.size = size
+        # False when the cover only holds a placeholder pixbuf
+        self.loaded = True
+
+        self._cache = cache
+        self._cache_key = object()
+        self._thumbnails = thumbnails
+        self._pixbuf = None
+        self.refill = None
+
+        if pixbuf:
+            self.pixbuf = pixbuf
+
+    @property
+    def pixbuf(self):
+        if self._cache:
+            pixbuf = self._cache.get(self._cache_key)
+        else:
+            pixbuf = self._pixbuf
+
+        if pixbuf is None:
+            if self.refill:
+                return self.refill(self)
+
+            pixbuf = self._decode()
+            self.pixbuf = pixbuf
+
+        return pixbuf
+
+    @pixbuf.setter
+    def pixbuf(self, pixbuf):
+        if self._cache:
+            self._cache.put(self._cache_key, pixbuf)
+        else:
+            self._pixbuf = pixbuf
+
+    @property
+    def cached(self):
+        '''
+        Indicates if the cover's pixbuf is available without recreating it.
+        '''
+        if self._cache:
+            return self._cache_key in self._cache
+
+        return self._pixbuf is not None
+
+    @classmethod
+    def decoder(cls, size, image, thumbnails=None):
+        '''
+        Returns a callable that decodes the image at the given size. It doesn't
+        touch any GObject, so it can be run on a worker thread.
+
+        :param thumbnails: `ThumbnailCache` where to look for the scaled
+            image before decoding it, and where to store it afterwards.
+        '''
+
+        def decode():
+            pixbuf = thumbnails.load(image, size) if thumbnails else None
+
+            if not pixbuf:
+                pixbuf = create_pixbuf_from_file_at_size(image, size, size)
+
+                if thumbnails:
+                    thumbnails.store(image, size, pixbuf)
 
-        self._create_pixbuf(size)
+            return pixbuf
+
+        return decode
 
     def resize(self, size):
         '''
         Resizes the cover's pixbuf.
         '''
         if self.size != size:
-            self._create_pixbuf(size)
+            self.size = size
+            self.pixbuf = self._decode()
             self.emit('resized')
 
-    def _create_pixbuf(self, size):
-        self.pixbuf = create_pixbuf_from_file_at_size(
-            self.original, size, size)
-
-        self.size = size
+    def _decode(self):
+        return self.decoder(self.size, self.original, self._thumbnails)()
 
 
 class Shadow(Cover):
@@ -117,63 +364,94 @@ class Shadow(Cover):
 
 
 class ShadowedCover(Cover):
-    def __init__(self, shadow, image):
-        super(ShadowedCover, self).__init__(shadow.cover_size, image)
+    def __init__(self, shadow, image, pixbuf=None, cache=None,
+                 thumbnails=None):
+        super(ShadowedCover, self).__init__(shadow.cover_size, image, pixbuf,
+                                            cache, thumbnails)
 
         self._shadow = shadow
 
-        self._add_shadow()
+    @classmethod
+    def decoder(cls, shadow, image, thumbnails=None):
+        # take the shadow's state now, since it may be resized on the main
+        # loop while the image is being decoded
+        shadow_pixbuf = shadow.pixbuf
+        width = shadow.width
+        size = shadow.size
+        cover_size = shadow.cover_size
+        variant = 'shadow:' + shadow.original
+
+        def decode():
+            pixbuf = thumbnails.load(image, size, variant) \
+                if thumbnails else None
+
+            if not pixbuf:
+                pixbuf = create_pixbuf_from_file_at_size(image, cover_size,
+                                                         cover_size)
+                pixbuf = cls._compose(shadow_pixbuf, pixbuf, width, size)
+
+                if thumbnails:
+                    thumbnails.store(image, size, pixbuf, variant)
+
+            return pixbuf
+
+        return decode
 
     def resize(self, size):
         if self.size != self._shadow.cover_size:
-            self._create_pixbuf(self._shadow.cover_size)
-            self._add_shadow()
+            self.size = self._shadow.cover_size
+            self.pixbuf = self._decode()
 
             self.emit('resized')
 
-    def _add_shadow(self):
-        pix = self._shadow.pixbuf
+    def _decode(self):
+        return self.decoder(self._shadow, self.original, self._thumbnails)()
 
+    @staticmethod
+    def _compose(shadow_pixbuf, pixbuf, width, size):
         surface = cairo.ImageSurface(
-            cairo.FORMAT_ARGB32, pix.get_width(), pix.get_height())
+            cairo.FORMAT_ARGB32, shadow_pixbuf.get_width(),
+            shadow_pixbuf.get_height())
         context = cairo.Context(surface)
 
         # draw shadow
-        Gdk.cairo_set_source_pixbuf(context, pix, 0, 0)
+        Gdk.cairo_set_source_pixbuf(context, shadow_pixbuf, 0, 0)
         context.paint()
 
         # draw cover
-        Gdk.cairo_set_source_pixbuf(context, self.pixbuf, self._shadow.width,
-                                    self._shadow.width)
+        Gdk.cairo_set_source_pixbuf(context, pixbuf, width, width)
         context.paint()
 
-        self.pixbuf = Gdk.pixbuf_get_from_surface(surface, 0, 0,
-                                                  self._shadow.size, self._shadow.size)
+        return Gdk.pixbuf_get_from_surface(surface, 0, 0, size, size)
 
 
-class Track(GObject.Object):
+class Track(object):
     '''
     A music track. Provides methods to access to most of the tracks data from
     Rhythmbox's database.
 
+    It's a plain object with a fixed set of slots, since there's one for every
+    entry of the library. Instead of signals, the `AlbumLoader` applies the
+    changes to the album that owns the track.
+
     :param entry: `RB.RhythmbDBEntry` rhythmbox's database entry for the track.
     :param db: `RB.RhythmbDB` instance. It's needed to update the track's
         values.
     '''
-    # signals
-    __gsignals__ = {
-        'modified': (GObject.SIGNAL_RUN_LAST, None, ()),
-        'deleted': (GObject.SIGNAL_RUN_LAST, None, ())
-    }
+    __slots__ = ('entry', '_db', 'location', 'owner')
 
-    __hash__ = GObject.__hash__
+    __hash__ = object.__hash__
 
     def __init__(self, entry, db=None):
-        super(Track, self).__init__()
-
         self.entry = entry
         self._db = db
 
+        # the location identifies the track on the loader, so it's kept
+        self.location = entry.get_string(RB.RhythmDBPropType.LOCATION)
+
+        # album the track belongs to
+        self.owner = None
+
     def __eq__(self, other):
         return rb.entry_equal(self.entry, other.entry)
 
@@ -213,14 +491,14 @@ class Track(GObject.Object):
     def duration(self):
         return self.entry.get_ulong(RB.RhythmDBPropType.DURATION)
 
-    @property
-    def location(self):
-        return self.entry.get_string(RB.RhythmDBPropType.LOCATION)
-
     @property
     def composer(self):
         return self.entry.get_string(RB.RhythmDBPropType.COMPOSER)
 
+    @property
+    def mtime(self):
+        return self.entry.get_ulong(RB.RhythmDBPropType.MTIME)
+
     @property
     def track_number(self):
         return self.entry.get_ulong(RB.RhythmDBPropType.TRACK_NUMBER)
@@ -275,6 +553,23 @@ class Album(GObject.Object):
 
     __hash__ = GObject.__hash__
 
+    # fields cached on demand from the tracks, and the attribute holding them
+    cached_fields = {
+        'album_sort': '_album_sort',
+        'album_artist_sort': '_album_artist_sort',
+        'artists': '_artists',
+        'track_titles': '_titles',
+        'composers': '_composers',
+        'genres': '_genres',
+        'track_order': '_track_order',
+        'ext_db_key': '_ext_db_key'
+    }
+
+    # fields that change whenever a track is added or removed
+    track_fields = frozenset(('artists', 'track_titles', 'composers',
+                              'genres', 'rating', 'duration', 'track_count',
+                              'track_order'))
+
     def __init__(self, name, artist, cover):
         super(Album, self).__init__()
 
@@ -286,28 +581,45 @@ class Album(GObject.Object):
         self._titles = None
         self._composers = None
         self._genres = None
-        self._tracks = []
+        # the tracks are kept on insertion order, indexed so they can be
+        # found and removed without going through all of them, and the
+        # tracks sorted by disc and track number are cached
+        self._tracks = collections.OrderedDict()
+        self._track_order = None
+        self._ext_db_key = None
         self._cover = None
         self.cover = cover
-        self._year = None
-        self._rating = None
-        self._duration = None
 
-        self._signals_id = {}
+        # increased on every modification, so the values derived from the
+        # album elsewhere know when they're outdated
+        self.revision = 0
+
+        # fields that may have changed on the last modification
+        self.modified_fields = frozenset()
+
+        # values of the tracks used to sort the album, kept up to date as
+        # tracks are added, modified or removed, along with the aggregates
+        # and the sort keys built from them
+        self._track_sort_values = {}
+        self._album_sorts = collections.Counter()
+        self._album_artist_sorts = collections.Counter()
+        self._years = collections.Counter()
+        self._year = 0
+        self._rating_sum = 0
+        self._duration_sum = 0
+        self._sort_keys = {}
 
     @property
     def album_artist_sort(self):
         if not self._album_artist_sort:
-            self._album_artist_sort = uniquify_and_sort(
-                [track.album_artist_sort for track in self._tracks])
+            self._album_artist_sort = sorted(self._album_artist_sorts)
 
         return self._album_artist_sort
 
     @property
     def album_sort(self):
         if not self._album_sort:
-            self._album_sort = uniquify_and_sort(
-                [track.album_sort for track in self._tracks])
+            self._album_sort = sorted(self._album_sorts)
 
         return self._album_sort
 
@@ -338,14 +650,6 @@ class Album(GObject.Object):
 
     @property
     def year(self):
-        if not self._year:
-            real_years = [track.year for track in self._tracks if track.year != 0]
-
-            if len(real_years) > 0:
-                self._year = min(real_years)
-            else:
-                self._year = 0
-
         return self._year
 
     @property
@@ -379,22 +683,132 @@ class Album(GObject.Object):
 
     @property
     def rating(self):
-        if not self._rating:
-            ratings = [track.rating for track in self._tracks
-                       if track.rating and track.rating != 0]
+        if self._rating_sum:
+            return self._rating_sum / len(self._tracks)
 
-            if len(ratings) > 0:
-                self._rating = sum(ratings) / len(self._tracks)
-            else:
-                self._rating = 0
-        return self._rating
+        return 0
 
     @rating.setter
     def rating(self, new_rating):
         for track in self._tracks:
             track.rating = new_rating
-        self._rating = None
-        self.emit('modified')
+
+        self.update_tracks(list(self._tracks), ('rating',))
+
+    def sort_key(self, sort_type):
+        '''
+        Returns the key used to sort the album by the given sort type. The
+        keys are built from the values kept for each track, so they don't
+        need to go through the tracks.
+
+        :param sort_type: `str` one of the keys of `sort_keys`.
+        '''
+        key = self._sort_keys.get(sort_type)
+
+        if key is None:
+            values = (getattr(self, prop) for prop in sort_keys[sort_type])
+            key = tuple(tuple(value) if isinstance(value, list) else value
+                        for value in values)
+
+            self._sort_keys[sort_type] = key
+
+        return key
+
+    def _update_sort_values(self, track, removed=False):
+        '''
+        Replaces the values a track contributes to the album's sort keys and
+        aggregates with its current ones, or just takes them out if the track
+        was removed. Returns the fields of the album whose value changed.
+        '''
+        changed = set()
+        year = self._year
+        rating_sum = self._rating_sum
+        duration_sum = self._duration_sum
+
+        # sort values no track holds anymore
+        gone = set()
+
+        old = self._track_sort_values.pop(track, None)
+
+        if old:
+            album_sort, album_artist_sort, old_year, rating, duration = old
+
+            for field, counter, value in (
+                    ('album_sort', self._album_sorts, album_sort),
+                    ('album_artist_sort', self._album_artist_sorts,
+                     album_artist_sort),
+                    ('year', self._years, old_year)):
+                if value in counter:
+                    counter[value] -= 1
+
+                    if not counter[value]:
+                        del counter[value]
+                        gone.add((field, value))
+
+            self._rating_sum -= rating
+            self._duration_sum -= duration
+
+            if old_year == self._year and old_year not in self._years:
+                # the earliest year is gone, look for the next one
+                self._year = min(self._years) if self._years else 0
+
+        if not removed:
+            new = (track.album_sort, track.album_artist_sort, track.year,
+                   track.rating or 0, track.duration)
+            album_sort, album_artist_sort, new_year, rating, duration = new
+
+            for field, counter, value in (
+                    ('album_sort', self._album_sorts, album_sort),
+                    ('album_artist_sort', self._album_artist_sorts,
+                     album_artist_sort)):
+                if value not in counter:
+                    if (field, value) in gone:
+                        # the track kept its value
+                        gone.discard((field, value))
+                    else:
+                        changed.add(field)
+
+                counter[value] += 1
+
+            self._rating_sum += rating
+            self._duration_sum += duration
+
+            # years of 0 mean unknown, and don't count for the album's year
+            if new_year:
+                self._years[new_year] += 1
+
+                if not self._year or new_year < self._year:
+                    self._year = new_year
+
+            self._track_sort_values[track] = new
+
+        changed.update(field for field, value in gone)
+
+        for field, before, after in (('year', year, self._year),
+                                     ('rating', rating_sum, self._rating_sum),
+                                     ('duration', duration_sum,
+                                      self._duration_sum)):
+            if before != after:
+                changed.add(field)
+            else:
+                changed.discard(field)
+
+        return changed
+
+    def _invalidate(self, fields):
+        '''
+        Forgets the cached values and sort keys that depend on the given
+        fields.
+        '''
+        for field in fields:
+            attr = self.cached_fields.get(field)
+
+            if attr:
+                setattr(self, attr, None)
+
+        for sort_type, props in sort_keys.items():
+            if fields.intersection(props):
+                self._sort_keys.pop(sort_type, None)
 
     @property
     def track_count(self):
@@ -402,10 +816,7 @@ class Album(GObject.Object):
 
     @property
     def duration(self):
-        if not self._duration:
-            self._duration = sum([track.duration for track in self._tracks])
-
-        return self._duration
+        return self._duration_sum
 
     @property
     def cover(self):
@@ -431,15 +842,18 @@ class Album(GObject.Object):
         :param rating_threshold: `float` threshold over which the rating of the
             track should be to be returned.
         '''
+        if self._track_order is None:
+            self._track_order = sorted(
+                self._tracks,
+                key=lambda track: (track.disc_number, track.track_number))
+
         if not rating_threshold:
             # if no threshold is set, return all
-            tracks = self._tracks
-        else:
-            # otherwise, only return the entries over the threshold
-            tracks = [track for track in self._tracks
-                      if track.rating >= rating_threshold]
+            return list(self._track_order)
 
-        return sorted(tracks, key=lambda track: (track.disc_number, track.track_number))
+        # otherwise, only return the entries over the threshold
+        return [track for track in self._track_order
+                if track.rating >= rating_threshold]
 
     def add_track(self, track):
         '''
@@ -447,52 +861,82 @@ class Album(GObject.Object):
 
         :param track: `Track` track to be added.
         '''
-        self._tracks.append(track)
-        ids = (track.connect('modified', self._track_modified),
-               track.connect('deleted', self._track_deleted))
+        self.add_tracks([track])
 
-        self._signals_id[track] = ids
-        self.emit('modified')
+    def add_tracks(self, tracks):
+        '''
+        Adds several tracks to the album, informing of the modification once.
 
-    def _track_modified(self, track):
-        print("_track_modified")
-        if track.album != self.name:
-            self._track_deleted(track)
-        else:
-            self.emit('modified')
+        :param tracks: `list` of `Track` to be added.
+        '''
+        changed = set(self.track_fields)
+
+        for track in tracks:
+            self._tracks[track] = None
+            changed |= self._update_sort_values(track)
+            track.owner = self
+
+        self._modified(changed)
+
+    def update_tracks(self, tracks, fields=None):
+        '''
+        Refreshes the values of several modified tracks of the album,
+        informing of the modification once.
+
+        :param tracks: `list` of `Track` that changed.
+        :param fields: `tuple` of the album's fields affected by the change
+            (e.g. 'rating' or 'track_titles'). If not given, all of them are
+            considered outdated.
+        '''
+        changed = set(self.cached_fields if fields is None else fields)
 
-    def _track_deleted(self, track):
-        print("_track_deleted")
-        self._tracks.remove(track)
+        for track in tracks:
+            changed |= self._update_sort_values(track)
 
-        # list(map(track.disconnect, self._signals_id[track]))
-        for signal_id in self._signals_id[track]:
-            track.disconnect(signal_id)
+        self._modified(changed)
 
-        del self._signals_id[track]
+    def remove_tracks(self, tracks):
+        '''
+        Removes several tracks from the album, informing of the modification,
+        or that the album is empty, once.
+
+        :param tracks: `list` of `Track` to be removed.
+        '''
+        changed = set(self.track_fields)
+
+        # the album's key is created from its first track
+        first = next(iter(self._tracks), None)
+
+        for track in tracks:
+            del self._tracks[track]
+            changed |= self._update_sort_values(track, removed=True)
+            track.owner = None
+
+        if first not in self._tracks:
+            changed.add('ext_db_key')
 
         if len(self._tracks) == 0:
             self.emit('emptied')
         else:
-            self.emit('modified')
+            self._modified(changed)
+
+    def _modified(self, fields):
+        self._invalidate(fields)
+        self.modified_fields = frozenset(fields)
+        self.emit('modified')
 
     def create_ext_db_key(self):
         '''
-        Creates a `RB.ExtDBKey` from this album's tracks.
+        Returns a `RB.ExtDBKey` for this album, created from its tracks the
+        first time it's needed.
         '''
-        return self._tracks[0].create_ext_db_key()
+        if not self._ext_db_key:
+            self._ext_db_key = next(iter(self._tracks)).create_ext_db_key()
+
+        return self._ext_db_key
 
     def do_modified(self):
-        self._album_artist = None
-        self._album_artist_sort = None
-        self._album_sort = None
-        self._artists = None
-        self._titles = None
-        self._genres = None
-        self._year = None
-        self._rating = None
-        self._duration = None
-        self._composers = None
+        self.revision += 1
 
     def __str__(self):
         return self.artist + self.name
@@ -515,7 +959,7 @@ class AlbumFilters(object):
         return filt
 
     @classmethod
-    def global_filter(cls, searchtext=None):
+    def global_filter(cls, searchtext=None, index=None):
         def filt(album):
             # this filter is more complicated: for each word in the search
             # text, it tries to find at least one match on the params of
@@ -523,6 +967,9 @@ class AlbumFilters(object):
             if not searchtext:
                 return True
 
+            if index:
+                return album in index.search('all', searchtext)
+
             words = RB.search_fold(searchtext).split()
             params = list(map(RB.search_fold, [album.name, album.artist,
                                                album.artists, album.track_titles, album.composers]))
@@ -543,21 +990,27 @@ class AlbumFilters(object):
         return filt
 
     @classmethod
-    def album_artist_filter(cls, searchtext=None):
+    def album_artist_filter(cls, searchtext=None, index=None):
         def filt(album):
             if not searchtext:
                 return True
 
+            if index:
+                return album in index.search('album_artist', searchtext)
+
             return RB.search_fold(searchtext) in RB.search_fold(album.artist)
 
         return filt
 
     @classmethod
-    def artist_filter(cls, searchtext=None):
+    def artist_filter(cls, searchtext=None, index=None):
         def filt(album):
             if not searchtext:
                 return True
 
+            if index:
+                return album in index.search('artist', searchtext)
+
             return RB.search_fold(searchtext) in RB.search_fold(album.artists)
 
         return filt
@@ -591,32 +1044,41 @@ class AlbumFilters(object):
         return filt
 
     @classmethod
-    def album_name_filter(cls, searchtext=None):
+    def album_name_filter(cls, searchtext=None, index=None):
         def filt(album):
             if not searchtext:
                 return True
 
+            if index:
+                return album in index.search('album_name', searchtext)
+
             return RB.search_fold(searchtext) in RB.search_fold(album.name)
 
         return filt
 
     @classmethod
-    def track_title_filter(cls, searchtext=None):
+    def track_title_filter(cls, searchtext=None, index=None):
         def filt(album):
             if not searchtext:
                 return True
 
+            if index:
+                return album in index.search('track', searchtext)
+
             return RB.search_fold(searchtext) in RB.search_fold(
                 album.track_titles)
 
         return filt
 
     @classmethod
-    def composer_filter(cls, searchtext=None):
+    def composer_filter(cls, searchtext=None, index=None):
         def filt(album):
             if not searchtext:
                 return True
 
+            if index:
+                return album in index.search('composers', searchtext)
+
             return RB.search_fold(searchtext) in RB.search_fold(
                 album.composers)
 
@@ -650,33 +1112,70 @@ class AlbumFilters(object):
         return filt
 
     @classmethod
-    def decade_filter(cls, searchdecade=None):
+    def decade_filter(cls, searchdecade=None, metadata=None):
         '''
         The year is in RATA DIE format so need to extract the year
 
         The searchdecade param can be None meaning all results
         or -1 for all albums older than our standard range which is 1930
         or an actual decade for 1930 to 2020
+
+        If an `AlbumMetadata` is given, the decades are read from it, and the
+        filter can be evaluated for every album at once through `vectorised`,
+        which returns a filter that only checks if the album was selected.
         '''
 
         def filt(album):
             if not searchdecade:
                 return True
 
-            if album.year == 0:
-                year = date.today().year
+            if metadata:
+                year = metadata.decade[metadata.get_id(album)]
             else:
-                year = datetime.fromordinal(album.year).year
-
-            year = int(round(year - 5, -1))
+                year = AlbumMetadata.decade_of(album.year)
 
             if searchdecade > 0:
                 return searchdecade == year
             else:
                 return year < 1930
 
+        if metadata and searchdecade:
+            def vectorised():
+                matching = metadata.select(metadata.decade_mask(searchdecade))
+
+                return lambda album: album in matching
+
+            filt.vectorised = vectorised
+
         return filt
 
+    @classmethod
+    def narrows(cls, filter_key, old_searchtext, new_searchtext):
+        '''
+        Indicates if, for the given text filter, the new search text can only
+        match a subset of the albums matched by the old one (e.g. when the
+        user keeps typing on the search entry).
+
+        :param filter_key: `str` key of the filter.
+        :param old_searchtext: `str` search text previously used.
+        :param new_searchtext: `str` search text about to be used.
+        '''
+        if filter_key not in cls.text_keys or not old_searchtext \
+                or not new_searchtext:
+            return False
+
+        old_text = RB.search_fold(old_searchtext)
+        new_text = RB.search_fold(new_searchtext)
+
+        if filter_key in cls.word_keys:
+            # every old word must be contained on one of the new words
+            new_words = new_text.split()
+
+            return all(any(word in new_word for new_word in new_words)
+                       for word in old_text.split())
+
+        return old_text in new_text
+
 
 AlbumFilters.keys = {
     'nay': AlbumFilters.nay_filter,
@@ -693,166 +1192,689 @@ AlbumFilters.keys = {
     'decade': AlbumFilters.decade_filter
 }
 
-sort_keys = {
-    'name': ('album_sort', 'album_sort'),
-    'artist': ('album_artist_sort', 'album_artist_sort'),
-    'year': ('year', 'album_sort'),
-    'rating': ('rating', 'album_sort'),
-}
+# filters that look for a text on the albums' fields, and those of them that
+# match word by word instead of the whole text
+AlbumFilters.text_keys = ('all', 'album_artist', 'artist', 'quick_artist',
+                          'composers', 'similar_artist', 'album_name', 'track')
+AlbumFilters.word_keys = ('all', 'similar_artist')
 
 
-class AlbumsModel(GObject.Object):
+class AlbumSearchIndex(object):
     '''
-    Model that contains albums, keeps them sorted, filtered and provides an
-    external `Gtk.TreeModel` interface to use as part of a Gtk interface.
+    Inverted index of the folded words found on the albums' searchable
+    fields. The search filters use it to answer a query by joining sets of
+    albums, instead of folding and scanning every album on each keystroke.
 
-    The `Gtk.TreeModel` haves the following structure:
-    column 0 -> string containing the album name and artist
-    column 1 -> pixbuf of the album's cover.
-    column 2 -> instance of the album itself.
-    column 3 -> markup text showed under the cover.
-    column 4 -> boolean that indicates if the row should be shown
+    The matching rules are the same ones used by `AlbumFilters`: a word
+    matches if it's contained anywhere on a field, and the field filters
+    require the whole search text to be contained on the field.
     '''
-    # signals
-    __gsignals__ = {
-        'generate-tooltip': (GObject.SIGNAL_RUN_LAST, str, (object,)),
-        'generate-markup': (GObject.SIGNAL_RUN_LAST, str, (object,)),
-        'album-updated': ((GObject.SIGNAL_RUN_LAST, None, (object, object))),
-        'visual-updated': ((GObject.SIGNAL_RUN_LAST, None, (object, object))),
-        'filter-changed': ((GObject.SIGNAL_RUN_FIRST, None, ())),
-        'album-added': ((GObject.SIGNAL_RUN_LAST, None, (object,)))
+    # searchable fields used by each of the filter keys
+    fields = {
+        'all': ('album_name', 'album_artist', 'artist', 'track', 'composers'),
+        'album_artist': ('album_artist',),
+        'artist': ('artist',),
+        'quick_artist': ('artist',),
+        'composers': ('composers',),
+        'album_name': ('album_name',),
+        'track': ('track',)
     }
 
-    # list of columns names and positions on the TreeModel
-    columns = {'tooltip': 0, 'pixbuf': 1, 'album': 2, 'markup': 3, 'show': 4}
-
-    def __init__(self):
-        super(AlbumsModel, self).__init__()
+    # fields of the album the searchable fields are built from
+    album_fields = frozenset(('artists', 'track_titles', 'composers'))
 
-        self._iters = {}
-        self._albums = SortedCollection(
-            key=lambda album: getattr(album, 'name'))
-        self._sortkey = {'type': 'name', 'order': True}
+    # maximum number of search results kept between changes on the index
+    MAX_CACHED_SEARCHES = 32
 
-        self._tree_store = Gtk.ListStore(str, GdkPixbuf.Pixbuf, object, str,
-                                         bool)
+    def __init__(self):
+        self._words = dict((field, {}) for field in self.fields['all'])
+        self._values = {}
+        self._searches = {}
+        self._last_searches = {}
 
-        # filters
-        self._filters = {}
+    def _fold_fields(self, album):
+        values = {'album_name': album.name,
+                  'album_artist': album.artist,
+                  'artist': album.artists,
+                  'track': album.track_titles,
+                  'composers': album.composers}
 
-        # sorting idle call
-        self._sort_process = None
+        return dict((field, RB.search_fold(value) if value else '')
+                    for field, value in values.items())
 
-        # create the filtered store that's used with the view
-        self._filtered_store = self._tree_store.filter_new()
-        self._filtered_store.set_visible_column(AlbumsModel.columns['show'])
+    def add(self, album):
+        '''
+        Indexes the searchable fields of an album.
 
-    @property
-    def store(self):
-        return self._filtered_store
+        :param album: `Album` to be added to the index.
+        '''
+        values = self._fold_fields(album)
 
-    @idle_iterator
-    def _recreate_text(self):
-        def process(album, data):
-            tree_iter = self._iters[album.name][album.artist]['iter']
-            markup = self.emit('generate-markup', album)
+        for field, value in values.items():
+            words = self._words[field]
 
-            self._tree_store.set(tree_iter, self.columns['markup'],
-                                 markup)
-            self._emit_signal(tree_iter, 'visual-updated')
+            for word in set(value.split()):
+                if word not in words:
+                    words[word] = set()
 
-        def error(exception):
-            print('Error while recreating text: ' + str(exception))
+                words[word].add(album)
 
-        return ALBUM_LOAD_CHUNK, process, None, error, None
+        self._values[album] = values
+        self._refresh_searches(album)
 
-    def _album_modified(self, album):
-        print("_album_modified")
-        tree_iter = self._iters[album.name][album.artist]['iter']
+    def remove(self, album):
+        '''
+        Removes an album from the index.
 
-        if self._tree_store.iter_is_valid(tree_iter):
-            # only update if the iter is valid
-            # generate and update values
-            tooltip, pixbuf, album, markup, hidden = \
-                self._generate_values(album)
+        :param album: `Album` to be removed from the index.
+        '''
+        values = self._values.pop(album, None)
 
-            self._tree_store.set(tree_iter, self.columns['tooltip'], tooltip,
-                                 self.columns['markup'], markup, self.columns['show'], hidden)
+        if values is None:
+            return
 
-            # reorder the album
-            new_pos = self._albums.reorder(album)
-
-            if new_pos != -1:
-                if (new_pos + 1) >= len(self._albums):
-                    old_album = self._albums[new_pos - 1]
-                    old_iter = \
-                        self._iters[old_album.name][old_album.artist]['iter']
-                    self._tree_store.move_after(tree_iter, old_iter)
-                else:
-                    old_album = self._albums[new_pos + 1]
-                    old_iter = \
-                        self._iters[old_album.name][old_album.artist]['iter']
-                    self._tree_store.move_before(tree_iter, old_iter)
+        for field, value in values.items():
+            words = self._words[field]
 
-            # inform that the album is updated
-            print("album modified")
-            print(album)
-            self._emit_signal(tree_iter, 'album-updated')
+            for word in set(value.split()):
+                albums = words.get(word)
 
-    def _cover_updated(self, album):
-        tree_iter = self._iters[album.name][album.artist]['iter']
+                if albums is not None:
+                    albums.discard(album)
 
-        if self._tree_store.iter_is_valid(tree_iter):
-            # only update if the iter is valid
-            pixbuf = album.cover.pixbuf
+                    if not albums:
+                        del words[word]
 
-            self._tree_store.set_value(tree_iter, self.columns['pixbuf'],
-                                       pixbuf)
+        self._refresh_searches(album)
 
-            self._emit_signal(tree_iter, 'visual-updated')
+    def _refresh_searches(self, album):
+        # the cached results are kept up to date by checking only the album
+        # that changed, instead of searching again
+        indexed = album in self._values
+        searches = list(self._searches.items()) + \
+                   [((filter_key, searchtext), result) for filter_key,
+                    (searchtext, result) in self._last_searches.items()]
+        refreshed = set()
 
-    def _emit_signal(self, tree_iter, signal):
-        # we get the filtered path and iter since that's what the outside world
-        # interacts with
-        tree_path = self._filtered_store.convert_child_path_to_path(
-            self._tree_store.get_path(tree_iter))
+        for (filter_key, searchtext), result in searches:
+            if id(result) in refreshed:
+                # the last search of a filter is usually cached too
+                continue
 
-        if tree_path:
-            # if there's no path, the album doesn't show on the filtered model
-            # so no one needs to know
-            tree_iter = self._filtered_store.get_iter(tree_path)
+            refreshed.add(id(result))
 
-            self.emit(signal, tree_path, tree_iter)
+            if indexed and self._matches(album, self.fields[filter_key],
+                                         RB.search_fold(searchtext)):
+                result.add(album)
+            else:
+                result.discard(album)
 
-    def add(self, album):
+    def update(self, album):
         '''
-        Add an album to the model.
+        Reindexes an album after its tracks have changed.
 
-        :param album: `Album` to be added to the model.
+        :param album: `Album` to be reindexed.
         '''
+        self.remove(album)
+        self.add(album)
 
-        # generate necessary values
-        values = self._generate_values(album)
-        # insert the values
-        tree_iter = self._tree_store.insert(self._albums.insert(album), values)
-        # connect signals
-        ids = (album.connect('modified', self._album_modified),
-               album.connect('cover-updated', self._cover_updated),
-               album.connect('emptied', self.remove))
-        if not album.name in self._iters:
-            self._iters[album.name] = {}
-        self._iters[album.name][album.artist] = {'album': album,
-                                                 'iter': tree_iter, 'ids': ids}
-        self.emit('album-added', album)
-        return tree_iter
+    def _find_word(self, field, word):
+        # the vocabulary is much smaller than the library, so scanning it
+        # keeps the substring semantics while still being cheap
+        matches = set()
 
-    def _generate_values(self, album):
-        tooltip = self.emit('generate-tooltip', album)
-        markup = self.emit('generate-markup', album)
-        pixbuf = album.cover.pixbuf
-        hidden = self._album_filter(album)
+        for indexed_word, albums in self._words[field].items():
+            if word in indexed_word:
+                matches |= albums
 
-        return tooltip, pixbuf, album, markup, hidden
+        return matches
+
+    def search(self, filter_key, searchtext):
+        '''
+        Returns the set of albums matching the search text for the given
+        filter key.
+
+        :param filter_key: `str` one of the keys on `AlbumSearchIndex.fields`.
+        :param searchtext: `str` text to look for.
+        '''
+        search_key = (filter_key, searchtext)
+
+        if search_key in self._searches:
+            return self._searches[search_key]
+
+        fields = self.fields[filter_key]
+        folded = RB.search_fold(searchtext)
+        last_search = self._last_searches.get(filter_key)
+
+        if last_search and AlbumFilters.narrows(filter_key, last_search[0],
+                                                searchtext):
+            # the text only narrows the last search, so just check the
+            # albums it matched
+            result = set(album for album in last_search[1]
+                         if self._matches(album, fields, folded))
+        else:
+            result = self._find(filter_key, fields, folded)
+
+        if len(self._searches) >= self.MAX_CACHED_SEARCHES:
+            self._searches.clear()
+
+        self._searches[search_key] = result
+        self._last_searches[filter_key] = (searchtext, result)
+
+        return result
+
+    def _matches(self, album, fields, folded):
+        values = self._values[album]
+
+        if len(fields) > 1:
+            return all(any(word in values[field] for field in fields)
+                       for word in folded.split())
+
+        return folded in values[fields[0]]
+
+    def _find(self, filter_key, fields, folded):
+        result = None
+
+        for word in folded.split():
+            matches = set()
+
+            for field in fields:
+                matches |= self._find_word(field, word)
+
+            result = matches if result is None else result & matches
+
+            if not result:
+                break
+
+        if filter_key != 'all':
+            # the field filters look for the whole text, not word by word;
+            # a text without words (e.g. only spaces) is looked for literally
+            # on every album
+            field = fields[0]
+            candidates = self._values if result is None else result
+            result = set(album for album in candidates
+                         if folded in self._values[album][field])
+        elif result is None:
+            result = set(self._values)
+
+        return result
+
+
+sort_keys = {
+    'name': ('album_sort', 'album_sort'),
+    'artist': ('album_artist_sort', 'album_artist_sort'),
+    'year': ('year', 'album_sort'),
+    'rating': ('rating', 'album_sort'),
+}
+
+
+class AlbumMetadata(object):
+    '''
+    Columnar store of the albums' numeric fields used by the queries that
+    involve many albums (duration and track count for the totals, decade for
+    the decade filter) on numpy arrays, so they're answered with vectorised
+    operations instead of going through each album's properties.
+
+    Each album gets a stable id, which is its row on the arrays. The rows of
+    removed albums are reused.
+    '''
+    fields = (('duration', 'int64'), ('track_count', 'int32'),
+              ('decade', 'int32'))
+
+    def __init__(self, capacity=1024):
+        self._ids = {}
+        self._free = []
+        self._next_id = 0
+
+        for field, dtype in self.fields:
+            setattr(self, field, numpy.zeros(capacity, dtype))
+
+        self.live = numpy.zeros(capacity, bool)
+        self._albums = numpy.empty(capacity, object)
+
+    @staticmethod
+    def decade_of(year):
+        '''
+        Returns the decade of a year in RATA DIE format, as used by the
+        decade filter. Unknown years count as the current one.
+        '''
+        if year == 0:
+            year = date.today().year
+        else:
+            year = datetime.fromordinal(year).year
+
+        return int(round(year - 5, -1))
+
+    def _grow(self):
+        capacity = len(self.live) * 2
+
+        for field, dtype in self.fields:
+            column = numpy.zeros(capacity, dtype)
+            column[:len(self.live)] = getattr(self, field)
+            setattr(self, field, column)
+
+        albums = numpy.empty(capacity, object)
+        albums[:len(self.live)] = self._albums
+        self._albums = albums
+
+        live = numpy.zeros(capacity, bool)
+        live[:len(self.live)] = self.live
+        self.live = live
+
+    def update(self, album):
+        '''
+        Adds an album or refreshes its fields.
+        '''
+        album_id = self._ids.get(album)
+
+        if album_id is None:
+            if self._free:
+                album_id = self._free.pop()
+            else:
+                if self._next_id == len(self.live):
+                    self._grow()
+
+                album_id = self._next_id
+                self._next_id += 1
+
+            self._ids[album] = album_id
+            self._albums[album_id] = album
+
+        self.duration[album_id] = album.duration
+        self.track_count[album_id] = album.track_count
+        self.decade[album_id] = self.decade_of(album.year)
+        self.live[album_id] = True
+
+    def remove(self, album):
+        album_id = self._ids.pop(album, None)
+
+        if album_id is not None:
+            self.live[album_id] = False
+            self._albums[album_id] = None
+            self._free.append(album_id)
+
+    def get_id(self, album):
+        return self._ids[album]
+
+    def select(self, mask):
+        '''
+        Returns the set of albums which ids are set on a boolean array.
+        '''
+        return set(self._albums[mask & self.live])
+
+    def decade_mask(self, searchdecade):
+        '''
+        Returns a boolean array telling, by album id, which albums are from
+        the given decade (or older than 1930 if the decade is negative).
+        '''
+        if searchdecade > 0:
+            return self.live & (self.decade == searchdecade)
+
+        return self.live & (self.decade < 1930)
+
+    def totals(self, albums):
+        '''
+        Returns the total number of tracks and duration in seconds of the
+        given albums, or None if any of them isn't on the store.
+        '''
+        try:
+            ids = [self._ids[album] for album in albums]
+        except (KeyError, TypeError):
+            return None
+
+        return int(self.track_count[ids].sum()), int(self.duration[ids].sum())
+
+
+class AlbumsStore(GObject.Object, Gtk.TreeModel):
+    '''
+    Virtual `Gtk.TreeModel` over the visible albums of an `AlbumsModel`. It
+    only keeps the visible albums, sorted like the model, and asks the model
+    for the values of a row when the view reads them, so nothing is
+    generated for the rows that are never drawn.
+
+    The columns are the ones described on `AlbumsModel`.
+
+    :param model: `AlbumsModel` that owns the albums.
+    '''
+    column_types = (GObject.TYPE_STRING, GdkPixbuf.Pixbuf.__gtype__,
+                    GObject.TYPE_PYOBJECT, GObject.TYPE_STRING,
+                    GObject.TYPE_BOOLEAN)
+
+    def __init__(self, model):
+        super(AlbumsStore, self).__init__()
+
+        self._model = model
+        self._rows = SortedCollection(key=model.get_all().key)
+        self._stamp = id(self) & 0x7fffffff
+
+    def contains(self, album):
+        return album in self._rows
+
+    def get_albums(self):
+        return list(self._rows)
+
+    def get_album_path(self, album):
+        '''
+        Returns the `Gtk.TreePath` of an album, or None if it isn't visible.
+        '''
+        if album not in self._rows:
+            return None
+
+        return Gtk.TreePath((self._rows.index(album),))
+
+    def show_album(self, album):
+        '''
+        Makes an album visible, inserting its row.
+        '''
+        if album not in self._rows:
+            index = self._rows.insert(album)
+            self.row_inserted(Gtk.TreePath((index,)), self._create_iter(index))
+
+    def hide_album(self, album):
+        '''
+        Hides an album, removing its row.
+        '''
+        if album in self._rows:
+            index = self._rows.index(album)
+            self._rows.remove(album)
+            self.row_deleted(Gtk.TreePath((index,)))
+
+    def update_album(self, album):
+        '''
+        Moves an album's row if its sort key changed and informs the view that
+        its values changed.
+        '''
+        if album not in self._rows:
+            return
+
+        old_index = self._rows.index(album)
+        index = self._rows.reorder(album)
+
+        if index == -1:
+            index = old_index
+        elif index != old_index:
+            new_order = list(range(len(self._rows)))
+            new_order.insert(index, new_order.pop(old_index))
+            self.rows_reordered(Gtk.TreePath(), None, new_order)
+
+        self.row_changed(Gtk.TreePath((index,)), self._create_iter(index))
+
+    def sort(self, key=None, reverse=False):
+        '''
+        Sorts the rows with a new key function and/or reverses them, moving
+        them with a single reorder.
+        '''
+        positions = dict((id(album), position)
+                         for position, album in enumerate(self._rows))
+
+        if key:
+            self._rows.key = key
+
+        if reverse:
+            self._rows = reversed(self._rows)
+
+        if len(self._rows) > 1:
+            self.rows_reordered(Gtk.TreePath(), None,
+                                [positions[id(album)] for album in self._rows])
+
+    def _create_iter(self, index):
+        tree_iter = Gtk.TreeIter()
+        tree_iter.stamp = self._stamp
+        tree_iter.user_data = index
+
+        return tree_iter
+
+    def _get_index(self, tree_iter):
+        return tree_iter.user_data or 0
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self):
+        return len(self.column_types)
+
+    def do_get_column_type(self, column):
+        return self.column_types[column]
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+
+        if len(indices) == 1 and 0 <= indices[0] < len(self._rows):
+            return True, self._create_iter(indices[0])
+
+        return False, None
+
+    def do_get_path(self, tree_iter):
+        return Gtk.TreePath((self._get_index(tree_iter),))
+
+    def do_get_value(self, tree_iter, column):
+        album = self._rows[self._get_index(tree_iter)]
+        value = GObject.Value(self.column_types[column])
+        data = self._model.get_value(album, column)
+
+        if data is not None:
+            value.set_value(data)
+
+        return value
+
+    def do_iter_next(self, tree_iter):
+        index = self._get_index(tree_iter) + 1
+
+        if index < len(self._rows):
+            tree_iter.user_data = index
+            return True
+
+        return False
+
+    def do_iter_previous(self, tree_iter):
+        index = self._get_index(tree_iter) - 1
+
+        if index >= 0:
+            tree_iter.user_data = index
+            return True
+
+        return False
+
+    def do_iter_children(self, parent):
+        if parent is None and self._rows:
+            return True, self._create_iter(0)
+
+        return False, None
+
+    def do_iter_has_child(self, tree_iter):
+        return False
+
+    def do_iter_n_children(self, tree_iter):
+        return len(self._rows) if tree_iter is None else 0
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is None and 0 <= n < len(self._rows):
+            return True, self._create_iter(n)
+
+        return False, None
+
+    def do_iter_parent(self, child):
+        return False, None
+
+
+class AlbumsModel(GObject.Object):
+    '''
+    Model that contains albums, keeps them sorted, filtered and provides an
+    external `Gtk.TreeModel` interface to use as part of a Gtk interface.
+
+    The `Gtk.TreeModel` haves the following structure:
+    column 0 -> string containing the album name and artist
+    column 1 -> pixbuf of the album's cover.
+    column 2 -> instance of the album itself.
+    column 3 -> markup text showed under the cover.
+    column 4 -> boolean that indicates if the row should be shown
+
+    Only the visible albums are on the `Gtk.TreeModel`, and the values of
+    a row are generated when they're read.
+    '''
+    # signals
+    __gsignals__ = {
+        'generate-tooltip': (GObject.SIGNAL_RUN_LAST, str, (object,)),
+        'generate-markup': (GObject.SIGNAL_RUN_LAST, str, (object,)),
+        'album-updated': ((GObject.SIGNAL_RUN_LAST, None, (object, object))),
+        'visual-updated': ((GObject.SIGNAL_RUN_LAST, None, (object, object))),
+        'text-updated': ((GObject.SIGNAL_RUN_LAST, None, ())),
+        'filter-changed': ((GObject.SIGNAL_RUN_FIRST, None, ())),
+        'album-added': ((GObject.SIGNAL_RUN_LAST, None, (object,)))
+    }
+
+    # list of columns names and positions on the TreeModel
+    columns = {'tooltip': 0, 'pixbuf': 1, 'album': 2, 'markup': 3, 'show': 4}
+
+    def __init__(self):
+        super(AlbumsModel, self).__init__()
+
+        self._iters = {}
+        self._albums = SortedCollection(
+            key=lambda album: getattr(album, 'name'))
+
+        # albums by the fields of their ext db keys, and the other way around
+        self._ext_db_albums = {}
+        self._ext_db_fields = {}
+        self._sortkey = {'type': 'name', 'order': True}
+
+        # filters
+        self._filters = {}
+        self._search_index = AlbumSearchIndex()
+
+        # numeric fields of the albums, for the vectorised queries
+        self.metadata = AlbumMetadata() if numpy else None
+
+        # keys of the filters that reject each album, and keys of the filters
+        # changed since the last refilter
+        self._rejected = {}
+        self._changed_filters = set()
+
+        # arguments of the current filters, and keys of the changed filters
+        # that only narrowed their previous results
+        self._filter_args = {}
+        self._narrowed_filters = set()
+
+        # keys of the filters that were only evaluated on the visible albums,
+        # so their results for the hidden ones are outdated
+        self._unchecked_filters = set()
+
+        # create the store with the visible albums that's used with the view
+        self._store = AlbumsStore(self)
+
+    @property
+    def store(self):
+        return self._store
+
+    def _album_modified(self, album):
+        print("_album_modified")
+
+        if album in self._albums:
+            # keep the search index in sync before filtering the album
+            if album.modified_fields & AlbumSearchIndex.album_fields:
+                self._search_index.update(album)
+
+            if 'ext_db_key' in album.modified_fields:
+                self._index_ext_db_key(album)
+
+            if self.metadata:
+                self.metadata.update(album)
+
+            # reorder the album
+            self._albums.reorder(album)
+
+            if self._album_filter(album):
+                self._store.show_album(album)
+                self._store.update_album(album)
+            else:
+                self._store.hide_album(album)
+
+            # inform that the album is updated
+            print("album modified")
+            print(album)
+            self._emit_signal(album, 'album-updated')
+
+    def _cover_updated(self, album):
+        if self._store.contains(album):
+            # only update if the album is visible
+            self._store.update_album(album)
+
+            self._emit_signal(album, 'visual-updated')
+
+    def _emit_signal(self, album, signal):
+        tree_path = self._store.get_album_path(album)
+
+        if tree_path:
+            # if there's no path, the album doesn't show on the store so no
+            # one needs to know
+            tree_iter = self._store.get_iter(tree_path)
+
+            self.emit(signal, tree_path, tree_iter)
+
+    def add(self, album):
+        '''
+        Add an album to the model.
+
+        :param album: `Album` to be added to the model.
+        '''
+
+        self._search_index.add(album)
+        self._albums.insert(album)
+
+        if self.metadata:
+            self.metadata.update(album)
+
+        if self._album_filter(album):
+            self._store.show_album(album)
+
+        # connect signals
+        ids = (album.connect('modified', self._album_modified),
+               album.connect('cover-updated', self._cover_updated),
+               album.connect('emptied', self.remove))
+        if not album.name in self._iters:
+            self._iters[album.name] = {}
+        self._iters[album.name][album.artist] = {'album': album, 'ids': ids}
+        self._index_ext_db_key(album)
+        self.emit('album-added', album)
+
+    @staticmethod
+    def _ext_db_key_fields(key):
+        # an album's key is identified by its name and the set of artists
+        artists = key.get_field_values('artist') or ()
+
+        return key.get_field('album'), frozenset(artists)
+
+    def _index_ext_db_key(self, album):
+        self._unindex_ext_db_key(album)
+
+        fields = self._ext_db_key_fields(album.create_ext_db_key())
+        self._ext_db_albums[fields] = album
+        self._ext_db_fields[album] = fields
+
+    def _unindex_ext_db_key(self, album):
+        fields = self._ext_db_fields.pop(album, None)
+
+        if fields and self._ext_db_albums.get(fields) is album:
+            del self._ext_db_albums[fields]
+
+    def get_value(self, album, column):
+        '''
+        Returns the value of a column for an album, generating it if needed.
+
+        :param album: `Album` which value is needed.
+        :param column: `int` column of the value, as in `columns`.
+        '''
+        if column == self.columns['pixbuf']:
+            return album.cover.pixbuf
+        elif column == self.columns['album']:
+            return album
+        elif column == self.columns['show']:
+            return not self._rejected.get(album)
+
+        elif column == self.columns['tooltip']:
+            return self.emit('generate-tooltip', album)
+        else:
+            return self.emit('generate-markup', album)
 
     def remove(self, album):
         '''
@@ -862,14 +1884,20 @@ class AlbumsModel(GObject.Object):
         '''
         print("album model remove")
         print(album)
+        self._store.hide_album(album)
         self._albums.remove(album)
-        self._tree_store.remove(self._iters[album.name][album.artist]['iter'])
+        self._search_index.remove(album)
+        self._rejected.pop(album, None)
+
+        if self.metadata:
+            self.metadata.remove(album)
 
         # disconnect signals
         for sig_id in self._iters[album.name][album.artist]['ids']:
             album.disconnect(sig_id)
 
         del self._iters[album.name][album.artist]
+        self._unindex_ext_db_key(album)
 
     def contains(self, album_name, album_artist):
         '''
@@ -913,7 +1941,7 @@ class AlbumsModel(GObject.Object):
 
         :param path: `Gtk.TreePath` referencing the album.
         '''
-        return self._filtered_store[path][self.columns['album']]
+        return self._store[path][self.columns['album']]
 
     def get_from_ext_db_key(self, key):
         '''
@@ -928,9 +1956,14 @@ class AlbumsModel(GObject.Object):
         # first check if there's a direct match
         album = self.get(name, artist) if self.contains(name, artist) else None
 
+        if not album:
+            # then look for an album with the same key fields
+            album = self._ext_db_albums.get(self._ext_db_key_fields(key))
+
         if not album:
             # get all the albums with the given name and look for a match
-            albums = [artist['album'] for artist in list(self._iters[name].values())]
+            albums = [artist['album']
+                      for artist in self._iters.get(name, {}).values()]
 
             for curr_album in albums:
                 if key.matches(curr_album.create_ext_db_key()):
@@ -940,13 +1973,11 @@ class AlbumsModel(GObject.Object):
         return album
 
     def get_path(self, album):
-        return self._filtered_store.convert_child_path_to_path(
-            self._tree_store.get_path(
-                self._iters[album.name][album.artist]['iter']))
+        return self._store.get_album_path(album)
 
     def find_first_visible(self, filter_key, filter_arg, start=None,
                            backwards=False):
-        album_filter = AlbumFilters.keys[filter_key](filter_arg)
+        album_filter = self._create_filter(filter_key, filter_arg)
 
         albums = reversed(self._albums) if backwards else self._albums
         ini = albums.index(start) + 1 if start else 0
@@ -954,7 +1985,7 @@ class AlbumsModel(GObject.Object):
         for i in range(ini, len(albums)):
             album = albums[i]
 
-            if album_filter(album) and self._album_filter(album):
+            if album_filter(album) and not self._rejected.get(album):
                 return album
 
         return None
@@ -968,27 +1999,10 @@ class AlbumsModel(GObject.Object):
         :param show: `bool` indcating whether to show(True) or hide(False) the
             album.
         '''
-        album_iter = self._iters[album.name][album.artist]['iter']
-
-        if self._tree_store.iter_is_valid(album_iter):
-            self._tree_store.set_value(album_iter, self.columns['show'], show)
-
-    @idle_iterator
-    def _sort(self):
-        def process(album, data):
-            values = self._generate_values(album)
-
-            tree_iter = self._tree_store.append(values)
-            self._iters[album.name][album.artist]['iter'] = tree_iter
-
-        def error(exception):
-            print('Error(1) while adding albums to the model: ' + str(exception))
-
-        def finish(data):
-            self._sort_process = None
-            self.remove_filter('nay')
-
-        return ALBUM_LOAD_CHUNK, process, None, error, finish
+        if show:
+            self._store.show_album(album)
+        else:
+            self._store.hide_album(album)
 
     def sort(self):
         '''
@@ -1019,8 +2033,7 @@ class AlbumsModel(GObject.Object):
             reverse = False
 
         def key_function(album):
-            keys = [getattr(album, prop) for prop in props]
-            return keys
+            return album.sort_key(sort_type)
 
         if not key and not reverse:
             print("nothing to sort")
@@ -1029,23 +2042,15 @@ class AlbumsModel(GObject.Object):
         print(key)
         print(reverse)
         if key:
-            props = sort_keys[key]
+            sort_type = key
             self._albums.key = key_function
 
         if reverse:
             self._albums = reversed(self._albums)
 
-        self._tree_store.clear()
-
-        # add the nay filter
-        self.replace_filter('nay', refilter=False)
-
-        if self._sort_process:
-            # stop the previous sort process if there's one
-            self._sort_process.stop()
-
-        # load the albums back to the model
-        self._sort_process = self._sort(iter(self._albums))
+        # the store moves its rows with a single reorder; the values aren't
+        # generated again
+        self._store.sort(key_function if key else None, reverse)
 
     def replace_filter(self, filter_key, filter_arg=None, refilter=True):
         '''
@@ -1058,11 +2063,36 @@ class AlbumsModel(GObject.Object):
         :param refilter: `bool` indicating whether to force a refilter and
         emit the 'filter-changed' signal(True) or not(False).
         '''
-        self._filters[filter_key] = AlbumFilters.keys[filter_key](filter_arg)
+        narrows = filter_key in self._filters and AlbumFilters.narrows(
+            filter_key, self._filter_args.get(filter_key), filter_arg)
+
+        if filter_key in self._changed_filters and \
+                filter_key not in self._narrowed_filters:
+            # the filter is waiting for a full pass already
+            narrows = False
+
+        if narrows:
+            self._narrowed_filters.add(filter_key)
+        else:
+            self._narrowed_filters.discard(filter_key)
+
+        self._filters[filter_key] = self._create_filter(filter_key, filter_arg)
+        self._filter_args[filter_key] = filter_arg
+        self._changed_filters.add(filter_key)
 
         if refilter:
             self.emit('filter-changed')
 
+    def _create_filter(self, filter_key, filter_arg):
+        if filter_key in AlbumSearchIndex.fields:
+            # search filters are answered by the index
+            return AlbumFilters.keys[filter_key](filter_arg,
+                                                 self._search_index)
+        elif filter_key == 'decade':
+            return AlbumFilters.decade_filter(filter_arg, self.metadata)
+
+        return AlbumFilters.keys[filter_key](filter_arg)
+
     def remove_filter(self, filter_key, refilter=True):
         '''
         Removes a filter by it's filter_key
@@ -1074,6 +2104,9 @@ class AlbumsModel(GObject.Object):
         '''
         if filter_key in self._filters:
             del self._filters[filter_key]
+            del self._filter_args[filter_key]
+            self._changed_filters.add(filter_key)
+            self._narrowed_filters.discard(filter_key)
 
             if refilter:
                 self.emit('filter-changed')
@@ -1083,28 +2116,164 @@ class AlbumsModel(GObject.Object):
         Clears all filters on the model.
         '''
         if self._filters:
+            self._changed_filters.update(self._filters)
             self._filters.clear()
+            self._filter_args.clear()
+            self._narrowed_filters.clear()
 
             self.emit('filter-changed')
 
     def do_filter_changed(self):
-        pos = 0
-        for show_result in list(map(self._album_filter, self._albums)):
-            self.show(self._albums[pos], show_result)
-            pos = pos + 1
+        # only the filters that changed are evaluated, and only the rows
+        # which visibility actually flipped are touched
+        changed = self._changed_filters
+        narrowed = self._narrowed_filters
+        self._changed_filters = set()
+        self._narrowed_filters = set()
+
+        if changed <= narrowed:
+            # narrowing filters can only hide albums, so the hidden ones
+            # don't need to be checked
+            albums = self._store.get_albums()
+            self._unchecked_filters |= changed
+        else:
+            albums = self._albums
+            changed |= self._unchecked_filters
+            self._unchecked_filters = set()
+
+        # the filters that can evaluate every album at once do it up front
+        filters = {}
+
+        for filter_key in changed:
+            album_filter = self._filters.get(filter_key)
+
+            if hasattr(album_filter, 'vectorised'):
+                album_filter = album_filter.vectorised()
+
+            filters[filter_key] = album_filter
+
+        for album in albums:
+            rejected = self._rejected.setdefault(album, set())
+            was_visible = not rejected
+
+            for filter_key in changed:
+                if filter_key in narrowed and filter_key in rejected:
+                    # a narrower search can't match it either
+                    continue
+
+                album_filter = filters[filter_key]
+
+                if album_filter and not album_filter(album):
+                    rejected.add(filter_key)
+                else:
+                    rejected.discard(filter_key)
+
+            if was_visible == bool(rejected):
+                self.show(album, not rejected)
 
     def _album_filter(self, album):
-        for f in list(self._filters.values()):
-            if not f(album):
-                return False
+        # evaluates every filter for the album, refreshing its cached results
+        rejected = set(filter_key for filter_key, album_filter
+                       in self._filters.items() if not album_filter(album))
+        self._rejected[album] = rejected
 
-        return True
+        return not rejected
 
     def recreate_text(self):
         '''
-        Forces the recreation and update of the markup text for each album.
+        Informs the views that the markup text of every album changed. The
+        rows aren't touched; the new text is read when they're redrawn.
         '''
-        self._recreate_text(iter(self._albums))
+        self.emit('text-updated')
+
+
+class AlbumIndex(object):
+    '''
+    On-disk snapshot of the album -> tracks grouping made by the
+    `AlbumLoader`. Each track is stored by its location together with its
+    mtime, so the snapshot can be checked against Rhythmbox's database after
+    the albums have already been shown.
+
+    :param filename: `str` path of the file holding the index. By default it
+        lives on the plugin's cache folder.
+    '''
+
+    def __init__(self, filename=None):
+        if not filename:
+            filename = os.path.join(RB.user_cache_dir(), 'coverart_browser',
+                                    'album_index.json')
+
+        self._filename = filename
+
+        # the snapshots are written by separate threads, one at a time; the
+        # serial keeps an older snapshot from replacing a newer one
+        self._lock = threading.Lock()
+        self._serial = 0
+        self._written = 0
+
+    def load(self):
+        '''
+        Returns a list of `(album_name, album_artist, tracks)` tuples, where
+        tracks is a list of `(location, mtime)` pairs. If there isn't an index
+        or it can't be used (e.g. it was written by another version), None
+        is returned.
+        '''
+        try:
+            with open(self._filename) as index_file:
+                index = json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if not isinstance(index, dict) or \
+                index.get('version') != ALBUM_INDEX_VERSION:
+            return None
+
+        return index.get('albums')
+
+    def save(self, albums):
+        '''
+        Writes the snapshot of the given albums to disk. The snapshot is taken
+        straight away, but it's written by a separate thread so the main loop
+        doesn't wait for the disk.
+
+        :param albums: iterable of `Album` to save.
+        '''
+        index = {'version': ALBUM_INDEX_VERSION, 'albums': []}
+
+        for album in albums:
+            tracks = [(track.location, track.mtime)
+                      for track in album.get_tracks()]
+            index['albums'].append((album.name, album.artist, tracks))
+
+        self._serial += 1
+
+        # not a daemon thread, so the interpreter waits for the write to end
+        thread = threading.Thread(target=self._write,
+                                  args=(index, self._serial))
+        thread.start()
+
+    def _write(self, index, serial):
+        with self._lock:
+            if serial < self._written:
+                # a newer snapshot was written already
+                return
+
+            self._written = serial
+            folder = os.path.dirname(self._filename)
+
+            try:
+                if not os.path.exists(folder):
+                    os.makedirs(folder)
+
+                # write to a temporary file first so a crash never leaves a
+                # truncated index behind
+                with tempfile.NamedTemporaryFile(mode='w', dir=folder,
+                                                 delete=False) as tmp:
+                    json.dump(index, tmp)
+
+                os.rename(tmp.name, self._filename)
+            except (IOError, OSError) as e:
+                print('Error while saving the album index: ' + str(e))
 
 
 class AlbumLoader(GObject.Object):
@@ -1125,6 +2294,20 @@ class AlbumLoader(GObject.Object):
 
         self._album_manager = album_manager
         self._tracks = {}
+        self._index = AlbumIndex()
+
+        # database changes waiting to be applied, by location: the entry and
+        # whether it should be allocated again or deleted
+        self._journal = collections.OrderedDict()
+        self._journal_id = None
+        self._journal_started = 0
+        self._journal_changed = 0
+
+        # whether the model is complete and changed since the index was saved
+        self._loaded = False
+        self._index_outdated = False
+        self._query_model = None
+        self._from_index = False
 
         self._connect_signals()
 
@@ -1160,9 +2343,12 @@ class AlbumLoader(GObject.Object):
                               self._album_manager.cover_man.unknown_cover)
                 data['albums'][album_name][album_artist] = album
 
-            album.add_track(track)
+            # the tracks are handed to the album when the chunk is published
+            data['grouped'].setdefault(album, []).append(track)
 
         def after(data):
+            self._publish_albums(data)
+
             # update the progress
             data['progress'] += ALBUM_LOAD_CHUNK
 
@@ -1172,205 +2358,680 @@ class AlbumLoader(GObject.Object):
             print('Error processing entries: ' + str(exception))
 
         def finish(data):
+            self._publish_albums(data)
+
             self._album_manager.progress = 1
             self.emit('albums-load-finished', data['albums'])
 
         return ALBUM_LOAD_CHUNK, process, after, error, finish
 
+    def _publish_albums(self, data):
+        '''
+        Gives the albums the tracks grouped since the last call, so each
+        album is modified only once per chunk. The new albums are added to
+        the model straight away, on their sort position, and their covers
+        start to load.
+        '''
+        model = self._album_manager.model
+        new_albums = []
+
+        for album, tracks in data['grouped'].items():
+            if model.contains(album.name, album.artist):
+                shown = model.get(album.name, album.artist)
+
+                if shown is not album:
+                    # the album was already added (e.g. from a database
+                    # change while loading), so the tracks go there
+                    data['albums'][album.name][album.artist] = shown
+
+                shown.add_tracks(tracks)
+            else:
+                album.add_tracks(tracks)
+                model.add(album)
+                new_albums.append(album)
+
+        data['grouped'].clear()
+
+        if new_albums:
+            self._album_manager.cover_man.load_covers(new_albums)
+
     @idle_iterator
-    def _load_model(self):
-        def process(albums, data):
-            # add  the album to the model
-            for album in list(albums.values()):
-                self._album_manager.model.add(album)
+    def _load_index(self):
+        def process(indexed_album, data):
+            album_name, album_artist, tracks = indexed_album
+            album_tracks = []
+
+            for location, mtime in tracks:
+                if location in self._tracks:
+                    # already allocated by a database change applied while
+                    # the index was loading
+                    continue
+
+                entry = self._album_manager.db.entry_lookup_by_location(
+                    location)
+
+                if not entry:
+                    continue
+
+                track = Track(entry, self._album_manager.db)
+
+                if track.mtime != mtime or track.album != album_name or \
+                        (track.album_artist or track.artist) != album_artist:
+                    # the file or its album changed since the snapshot was
+                    # taken, leave it to the check against the database
+                    continue
+
+                self._tracks[location] = track
+                album_tracks.append(track)
+
+            if album_tracks:
+                model = self._album_manager.model
+
+                if model.contains(album_name, album_artist):
+                    # the album was already added (e.g. from a database
+                    # change while loading)
+                    album = model.get(album_name, album_artist)
+                    album.add_tracks(album_tracks)
+                else:
+                    album = Album(album_name, album_artist,
+                                  self._album_manager.cover_man.unknown_cover)
+                    album.add_tracks(album_tracks)
+
+                    # the album is complete, so it's shown straight away
+                    model.add(album)
+                    data['new'].append(album)
+
+                if album_name not in data['albums']:
+                    data['albums'][album_name] = {}
+
+                data['albums'][album_name][album_artist] = album
 
         def after(data):
-            data['progress'] += ALBUM_LOAD_CHUNK
+            self._load_new_covers(data)
 
             # update the progress
-            self._album_manager.progress = 1 - data['progress'] / data['total']
+            data['progress'] += ALBUM_LOAD_CHUNK
+
+            self._album_manager.progress = data['progress'] / data['total']
 
         def error(exception):
-            dumpstack("Something awful happened!")
-            print('Error(2) while adding albums to the model: ' + str(exception))
+            print('Error processing the album index: ' + str(exception))
 
         def finish(data):
-            self._album_manager.progress = 0
-            self.emit('model-load-finished')
-            return False
+            self._load_new_covers(data)
+
+            self._album_manager.progress = 1
+            self.emit('albums-load-finished', data['albums'])
 
         return ALBUM_LOAD_CHUNK, process, after, error, finish
 
-    def _entry_changed_callback(self, db, entry, changes):
-        print("CoverArtBrowser DEBUG - entry_changed_callback")
-        # NOTE: changes are packed in array of rhythmdbentrychange
+    def _load_new_covers(self, data):
+        if data['new']:
+            self._album_manager.cover_man.load_covers(data['new'])
+            data['new'] = []
+
+    @idle_iterator
+    def _check_index(self):
+        def process(row, data):
+            entry = data['model'][row.path][0]
+            location = entry.get_string(RB.RhythmDBPropType.LOCATION)
+
+            data['seen'].add(location)
+
+            if location not in self._tracks:
+                # new or changed entry since the snapshot was taken
+                self._journal_change(location, entry, 'allocate')
+
+        def error(exception):
+            print('Error while checking the album index: ' + str(exception))
+
+        def finish(data):
+            # any track not seen on the database anymore has been removed
+            for location in set(self._tracks) - data['seen']:
+                self._journal_change(location, None, 'delete')
+
+            self._apply_journal()
+            self.save_index()
+
+        return ALBUM_LOAD_CHUNK, process, None, error, finish
+
+    def _entry_changed_callback(self, db, entry, changes):
+        print("CoverArtBrowser DEBUG - entry_changed_callback")
+        # NOTE: changes are packed in array of rhythmdbentrychange
+        location = entry.get_string(RB.RhythmDBPropType.LOCATION)
+
+        # RB3 has a simple rhythmdbentrychange array to deal with so we
+        #just need to loop each element of the array
+        for change in changes:
+            if change.prop is RB.RhythmDBPropType.ALBUM \
+                    or change.prop is RB.RhythmDBPropType.ALBUM_ARTIST \
+                    or change.prop is RB.RhythmDBPropType.ARTIST \
+                    or change.prop is RB.RhythmDBPropType.ALBUM_SORTNAME \
+                    or change.prop is RB.RhythmDBPropType.ALBUM_ARTIST_SORTNAME:
+                # called when the album of a entry is modified
+                self._journal_change(location, entry, 'allocate')
+
+            elif change.prop is RB.RhythmDBPropType.HIDDEN:
+                # called when an entry gets hidden (e.g.:the sound file is
+                # removed.
+                if change.new:
+                    self._journal_change(location, entry, 'delete')
+                else:
+                    self._journal_change(location, entry, 'allocate')
+
+            elif change.prop in TRACK_PROP_FIELDS:
+                # only the album's fields built from the property change
+                self._journal_change(location, entry, 'update',
+                                     TRACK_PROP_FIELDS[change.prop])
+
+        print("CoverArtBrowser DEBUG - end entry_changed_callback")
+
+    def _entry_added_callback(self, db, entry):
+        print("CoverArtBrowser DEBUG - entry_added_callback")
+        self._journal_change(entry.get_string(RB.RhythmDBPropType.LOCATION),
+                             entry, 'allocate')
+
+        print("CoverArtBrowser DEBUG - end entry_added_callback")
+
+    def _entry_deleted_callback(self, db, entry):
+        print("CoverArtBrowser DEBUG - entry_deleted_callback")
+        self._journal_change(entry.get_string(RB.RhythmDBPropType.LOCATION),
+                             entry, 'delete')
+
+        print("CoverArtBrowser DEBUG - end entry_deleted_callback")
+
+    def _journal_change(self, location, entry, action, fields=()):
+        '''
+        Records a change of the database to be applied with the ones that
+        arrive shortly after it. Only the last allocation or deletion of each
+        entry matters, since both set the entry's final state; the updates
+        are merged with any change already recorded for the entry.
+
+        :param action: `str` either 'allocate', to put the entry's track on
+            its current album, 'delete', to remove it, or 'update', to
+            refresh the given fields of the album that holds the track.
+        :param fields: `tuple` of the album's fields affected by an update.
+        '''
+        recorded = self._journal.pop(location, None)
+
+        if action == 'update' and recorded:
+            entry, action, recorded_fields = recorded
+
+            if action == 'update':
+                fields = recorded_fields | set(fields)
+
+        self._journal[location] = (entry, action, set(fields))
+
+        # the changes are applied once the database stays quiet for a while
+        self._journal_changed = GLib.get_monotonic_time()
+
+        if not self._journal_id:
+            self._journal_started = self._journal_changed
+            self._journal_id = Gdk.threads_add_timeout(
+                GLib.PRIORITY_DEFAULT_IDLE, DB_CHANGES_DELAY,
+                self._journal_timeout)
+
+    def _journal_timeout(self, *args):
+        now = GLib.get_monotonic_time()
+
+        if now - self._journal_changed < DB_CHANGES_DELAY * 1000 and \
+                now - self._journal_started < DB_CHANGES_MAX_DELAY * 1000:
+            # still changing, wait for another period
+            return True
+
+        self._journal_id = None
+        self._apply_journal()
+
+        return False
+
+    def _apply_journal(self):
+        '''
+        Applies the collected database changes, grouped by album, so each
+        affected album is modified, and re-sorted, only once.
+        '''
+        if self._journal_id:
+            GLib.source_remove(self._journal_id)
+            self._journal_id = None
+
+        journal = self._journal
+        self._journal = collections.OrderedDict()
+
+        if journal:
+            # the index is saved again at shutdown
+            self._index_outdated = True
+
+        removed = collections.OrderedDict()
+        updated = collections.OrderedDict()
+        added = collections.OrderedDict()
+
+        for location, (entry, action, fields) in journal.items():
+            track = self._tracks.get(location)
+
+            if action == 'update':
+                if track and track.owner:
+                    tracks, album_fields = updated.setdefault(
+                        track.owner, ([], set()))
+                    tracks.append(track)
+
+                    if album_fields is not None:
+                        album_fields |= fields
+
+                continue
+
+            if action == 'allocate':
+                if not track:
+                    track = Track(entry, self._album_manager.db)
+
+                if track.duration > 0 and track.is_saveable:
+                    # only allocate the track if it's a valid track
+                    album_name = track.album
+                    album_artist = track.album_artist or track.artist
+                    key = (album_name, album_artist)
+                    owner = track.owner
+
+                    if owner and (owner.name, owner.artist) == key:
+                        # still on the same album, everything may change
+                        tracks, album_fields = updated.get(owner, ([], None))
+                        tracks.append(track)
+                        updated[owner] = (tracks, None)
+                        continue
+
+                    if owner:
+                        removed.setdefault(owner, []).append(track)
+
+                    self._tracks[location] = track
+                    added.setdefault(key, []).append(track)
+                    continue
+
+            # deleted, or not valid anymore
+            if location in self._tracks:
+                del self._tracks[location]
+
+                if track.owner:
+                    removed.setdefault(track.owner, []).append(track)
+
+        for album, tracks in removed.items():
+            album.remove_tracks(tracks)
+
+        for album, (tracks, fields) in updated.items():
+            if album.track_count:
+                album.update_tracks(tracks, fields)
+
+        model = self._album_manager.model
+
+        for (album_name, album_artist), tracks in added.items():
+            if model.contains(album_name, album_artist):
+                print("allocate tracks - contains")
+                album = model.get(album_name, album_artist)
+                album.add_tracks(tracks)
+            else:
+                print("allocate tracks - does not contain")
+                album = Album(album_name, album_artist,
+                              self._album_manager.cover_man.unknown_cover)
+                album.add_tracks(tracks)
+                self._album_manager.cover_man.load_cover(album)
+                model.add(album)
+
+        return False
+
+    def load_albums(self, query_model):
+        '''
+        Loads and creates `Track` instances for all entries on query_model,
+        assigning them into their correspondant `Album`.
+        '''
+        print("CoverArtBrowser DEBUG - load_albums")
+
+        self._query_model = query_model
+        indexed_albums = self._index.load()
+
+        if indexed_albums is not None:
+            # show the albums from the last snapshot straight away; they are
+            # checked against the database once they're on the model
+            self._load_index(iter(indexed_albums), albums={}, new=[],
+                             total=len(indexed_albums), progress=0.)
+            self._from_index = True
+        else:
+            self._load_albums(iter(query_model), albums={},
+                              grouped=collections.OrderedDict(),
+                              model=query_model, total=len(query_model),
+                              progress=0.)
+            self._from_index = False
+
+        print("CoverArtBrowser DEBUG - load_albums finished")
+
+    def save_index(self):
+        '''
+        Saves a snapshot of the current albums, so the next load can use it.
+        '''
+        self._index.save(self._album_manager.model.get_all())
+        self._index_outdated = False
+
+    def shutdown(self):
+        '''
+        Applies the database changes still waiting on the journal and saves
+        the index if the albums changed since it was last saved.
+        '''
+        if not self._loaded:
+            return
+
+        self._apply_journal()
+
+        if self._index_outdated:
+            self.save_index()
+
+    def do_albums_load_finished(self, albums):
+        # the albums were added to the model as they were loaded
+        self.emit('model-load-finished')
+
+    def do_model_load_finished(self):
+        self._loaded = True
+
+        if self._from_index:
+            # apply whatever changed on the database since the snapshot
+            self._check_index(iter(self._query_model), model=self._query_model,
+                              seen=set())
+        else:
+            self.save_index()
+
 
-        def analyse_change(change):
-            print(change.prop)
-            if change.prop is RB.RhythmDBPropType.ALBUM \
-                    or change.prop is RB.RhythmDBPropType.ALBUM_ARTIST \
-                    or change.prop is RB.RhythmDBPropType.ARTIST \
-                    or change.prop is RB.RhythmDBPropType.ALBUM_SORTNAME \
-                    or change.prop is RB.RhythmDBPropType.ALBUM_ARTIST_SORTNAME:
-                # called when the album of a entry is modified
-                track.emit('deleted')
-                track.emit('modified')
-                print("change prop album or artist")
-                self._allocate_track(track)
+class SearchMissCache(object):
+    '''
+    Persistent record of the cover searches that didn't find anything, so
+    they aren't repeated until some time has passed. Each miss is keyed by
+    the fields of the searched `RB.ExtDBKey` and by the search providers
+    that were enabled, so enabling another provider makes the coverobjects
+    searchable again.
+
+    :param name: `str` name of the file holding the record, on the plugin's
+        cache folder.
+    :param ttl: `int` seconds a miss is remembered.
+    '''
 
-            elif change.prop is RB.RhythmDBPropType.HIDDEN:
-                # called when an entry gets hidden (e.g.:the sound file is
-                # removed.
-                print(change)
-                if change.new:
-                    print("change prop new")
-                    track.emit('deleted')
-                else:
-                    print("change prop dunno")
-                    self._allocate_track(track)
+    def __init__(self, name, ttl):
+        self._filename = os.path.join(RB.user_cache_dir(), 'coverart_browser',
+                                      name)
+        self._ttl = ttl
+        self._misses = None
+        self._changed = False
 
+    def _load(self):
         try:
-            # look at all the changes and update the albums accordingly
-            track = self._tracks[Track(entry).location]
+            with open(self._filename) as misses_file:
+                misses = json.load(misses_file)
+        except (IOError, OSError, ValueError):
+            misses = {}
 
-            # RB3 has a simple rhythmdbentrychange array to deal with so we
-            #just need to loop each element of the array
+        if not isinstance(misses, dict):
+            misses = {}
 
-            for change in changes:
-                analyse_change(change)
-        except:
-            pass
-            
-        print("CoverArtBrowser DEBUG - end entry_changed_callback")
+        # forget the expired misses
+        now = time.time()
+        self._misses = dict((key, when) for key, when in misses.items()
+                            if now - when < self._ttl)
+        self._changed = len(self._misses) != len(misses)
 
-    def _entry_added_callback(self, db, entry):
-        print("CoverArtBrowser DEBUG - entry_added_callback")
-        self._allocate_track(Track(entry, db))
+    def _key(self, ext_db_key, providers):
+        fields = []
 
-        print("CoverArtBrowser DEBUG - end entry_added_callback")
+        for field in sorted(ext_db_key.get_field_names()):
+            fields.append((field, list(ext_db_key.get_field_values(field))))
 
-    def _entry_deleted_callback(self, db, entry):
-        print("CoverArtBrowser DEBUG - entry_deleted_callback")
-        prototype = Track(entry).location
+        return json.dumps([fields, sorted(providers)])
 
-        if prototype in self._tracks:
-            # gotta check if the track is loaded first
-            track = self._tracks[prototype]
-            del self._tracks[track.location]
+    def missed(self, ext_db_key, providers):
+        '''
+        Returns whether a search for the key with the given providers found
+        nothing recently.
+        '''
+        if self._ttl <= 0:
+            return False
 
-            track.emit('deleted')
+        if self._misses is None:
+            self._load()
 
-        print("CoverArtBrowser DEBUG - end entry_deleted_callback")
+        when = self._misses.get(self._key(ext_db_key, providers))
 
-    def _allocate_track(self, track):
-        if track.duration > 0 and track.is_saveable:
-            # only allocate the track if it's a valid track
-            self._tracks[track.location] = track
+        return when is not None and time.time() - when < self._ttl
 
-            album_name = track.album
-            album_artist = track.album_artist
-            album_artist = album_artist if album_artist else track.artist
+    def add(self, ext_db_key, providers):
+        '''
+        Records that a search for the key with the given providers found
+        nothing.
+        '''
+        if self._ttl <= 0:
+            return
 
-            if self._album_manager.model.contains(album_name, album_artist):
-                print("allocate track - contains")
-                album = self._album_manager.model.get(album_name, album_artist)
-                print(album)
-                album.add_track(track)
-            else:
-                print("allocate track - does not contain")
-                album = Album(album_name, album_artist,
-                              self._album_manager.cover_man.unknown_cover)
-                print(album)
-                album.add_track(track)
-                self._album_manager.cover_man.load_cover(album)
-                self._album_manager.model.add(album)
+        if self._misses is None:
+            self._load()
 
-    def load_albums(self, query_model):
+        self._misses[self._key(ext_db_key, providers)] = time.time()
+        self._changed = True
+
+    def save(self):
         '''
-        Loads and creates `Track` instances for all entries on query_model,
-        assigning them into their correspondant `Album`.
+        Writes the record to disk, if it has changed.
         '''
-        print("CoverArtBrowser DEBUG - load_albums")
+        if not self._changed:
+            return
 
-        self._load_albums(iter(query_model), albums={}, model=query_model,
-                          total=len(query_model), progress=0.)
+        folder = os.path.dirname(self._filename)
 
-        print("CoverArtBrowser DEBUG - load_albums finished")
+        try:
+            if not os.path.exists(folder):
+                os.makedirs(folder)
 
-    def do_albums_load_finished(self, albums):
-        # load the albums to the model
-        self._album_manager.model.replace_filter('nay')
-        self._load_model(iter(list(albums.values())), total=len(albums), progress=0.)
+            with tempfile.NamedTemporaryFile(mode='w', dir=folder,
+                                             delete=False) as tmp:
+                json.dump(self._misses, tmp)
 
-    def do_model_load_finished(self):
-        self._album_manager.model.remove_filter('nay')
+            os.rename(tmp.name, self._filename)
+            self._changed = False
+        except (IOError, OSError) as e:
+            print('Error while saving the cover search misses: ' + str(e))
 
 
 class CoverRequester(GObject.Object):
-    def __init__(self, cover_db):
+    '''
+    Requests the covers of a queue of coverobjects to a cover_db. Several
+    requests are kept in flight at the same time, and they're dispatched no
+    faster than the configured interval.
+
+    Each request is identified by a search id, so a late callback or timeout
+    of a request can't be taken for another one. The timeout adapts to how
+    long the requests take to answer, and it backs off when they time out.
+
+    Coverobjects whose last search found nothing recently are skipped,
+    unless they're queued with force.
+
+    :param cover_db: `RB.ExtDB` to which request the covers.
+    :param misses: `SearchMissCache` where the searches that found nothing
+        are recorded.
+    '''
+    # bounds of the adaptive timeout, in milliseconds
+    MIN_TIMEOUT = 5000
+    MAX_TIMEOUT = 40000
+
+    def __init__(self, cover_db, misses):
         super(CoverRequester, self).__init__()
 
         self._cover_db = cover_db
+        self._misses = misses
+        self._forced = set()
+        self._providers = []
         self.unknown_cover = None
         self._callback = None
-        self._queue = []
-        self._queue_id = 0
+        # bulk and priority queues, plus the coverobjects queued and whether
+        # they have priority
+        self._queue = collections.deque()
+        self._priority_queue = collections.deque()
+        self._queued = {}
+        self._search_id = 0
+        self._in_flight = {}
         self._running = False
         self._stop = False
 
-    def add_to_queue(self, coverobjects, callback):
-        ''' Adds coverobjects to the queue if they're not already there. '''
-        self._queue.extend(
-            [coverobject for coverobject in coverobjects if coverobject not in self._queue])
+        gs = GSetting()
+        self._parallel = max(1, gs.get_value(gs.Path.PLUGIN,
+                                             gs.PluginKey.COVER_SEARCH_PARALLEL))
+        self._interval = max(0, gs.get_value(gs.Path.PLUGIN,
+                                             gs.PluginKey.COVER_SEARCH_INTERVAL))
+
+        self._timeout = self.MIN_TIMEOUT * 2
+        self._response_time = None
+        self._backoff = 1
+        self._next_dispatch = 0
+        self._dispatch_id = None
+
+    def add_to_queue(self, coverobjects, callback, priority=False,
+                     force=False):
+        '''
+        Adds coverobjects to the queue if they're not already there.
+
+        :param priority: `bool` whether the coverobjects should be requested
+            before the rest of the queue. Coverobjects already queued are moved
+            ahead.
+        :param force: `bool` whether to search the coverobjects even if a
+            recent search didn't find anything.
+        '''
+        for coverobject in coverobjects:
+            self._enqueue(coverobject, priority)
+
+            if force:
+                self._forced.add(coverobject)
 
         self._start_process(callback)
 
-    def replace_queue(self, coverobjects, callback):
+    def replace_queue(self, coverobjects, callback, force=False):
         ''' Completely replace the current queue. '''
-        self._queue = coverobjects
+        self._clear_queue()
+
+        for coverobject in coverobjects:
+            self._enqueue(coverobject, False)
+
+            if force:
+                self._forced.add(coverobject)
 
         self._start_process(callback)
 
+    def prioritize(self, coverobjects):
+        '''
+        Moves the given coverobjects ahead of the rest of the queue, if
+        they're queued. Nothing is added to the queue.
+        '''
+        for coverobject in coverobjects:
+            if coverobject in self._queued:
+                self._enqueue(coverobject, True)
+
+    def _enqueue(self, coverobject, priority):
+        if priority:
+            if self._queued.get(coverobject):
+                return
+
+            # a copy left on the bulk queue is skipped when it's reached
+            self._priority_queue.append(coverobject)
+        elif coverobject not in self._queued:
+            self._queue.append(coverobject)
+        else:
+            return
+
+        self._queued[coverobject] = priority
+
+    def _dequeue(self):
+        '''
+        Returns the next coverobject of the queue, or None if it's empty.
+        '''
+        for queue in (self._priority_queue, self._queue):
+            while queue:
+                coverobject = queue.popleft()
+                priority = self._queued.get(coverobject)
+
+                if priority is not None and \
+                        priority == (queue is self._priority_queue):
+                    del self._queued[coverobject]
+                    return coverobject
+
+        return None
+
+    def _clear_queue(self):
+        self._priority_queue.clear()
+        self._queue.clear()
+        self._queued.clear()
+        self._forced.clear()
+
     def _start_process(self, callback):
         ''' Starts the queue processing if it isn't running already '''
         if not self._running:
             self._callback = callback
             self._running = True
-            self._process_queue()
+            self._providers = get_search_providers()
+
+        self._process_queue()
 
     def _process_queue(self):
         '''
         Main method that process the queue.
-        First, it tries to adquire a lock on the queue, and if it can, pops
-        the next element of the queue and process it.
-        The lock makes sure that only one request is done at a time, and
-        successfully ignores false timeouts or strand callbacks.
+        It dispatches the next elements of the queue while there are free
+        request slots, waiting for the dispatch interval between each one.
+        Once the queue is empty and every request has finished, the callback
+        is informed that the process is over.
         '''
-        # process the next element in the queue
-        while self._queue:
-            coverobject = self._queue.pop(0)
+        while self._queued and len(self._in_flight) < self._parallel:
+            wait = self._next_dispatch - GLib.get_monotonic_time() // 1000
 
-            if coverobject.cover is self.unknown_cover:
-                break
-        else:
-            coverobject = None
+            if wait > 0:
+                # rate limited, come back once the interval has passed
+                if not self._dispatch_id:
+                    self._dispatch_id = Gdk.threads_add_timeout(
+                        GLib.PRIORITY_DEFAULT_IDLE, wait, self._dispatch_due)
+                return
 
-        if coverobject:
-            # inform the current coverobject being searched
-            self._callback(coverobject)
+            coverobject = self._dequeue()
 
-            # start the request
-            self._queue_id += 1
-            self._search_for_cover(coverobject, self._queue_id)
+            if not coverobject or coverobject.cover is not self.unknown_cover:
+                continue
 
-            # add a timeout to the request
-            Gdk.threads_add_timeout_seconds(GLib.PRIORITY_DEFAULT_IDLE, 40,
-                                            self._next, self._queue_id)
-        else:
+            if coverobject in self._forced:
+                self._forced.discard(coverobject)
+            elif self._misses.missed(coverobject.create_ext_db_key(),
+                                     self._providers):
+                # searched recently without finding anything
+                continue
+
+            self._dispatch(coverobject)
+
+        if self._running and not self._queued and not self._in_flight:
             # if there're no more elements, clean the state of the requester
             self._running = False
+            self._misses.save()
             self._callback(None)
 
+    def _dispatch_due(self, *args):
+        self._dispatch_id = None
+        self._process_queue()
+
+        return False
+
+    def _dispatch(self, coverobject):
+        '''
+        Starts the request of a coverobject's cover, with its own search id
+        and timeout.
+        '''
+        now = GLib.get_monotonic_time() // 1000
+        self._next_dispatch = now + self._interval * self._backoff
+
+        # inform the current coverobject being searched
+        self._callback(coverobject)
+
+        self._search_id += 1
+        search_id = self._search_id
+        self._in_flight[search_id] = (now, coverobject)
+
+        # add a timeout to the request
+        Gdk.threads_add_timeout(GLib.PRIORITY_DEFAULT_IDLE, self._timeout,
+                                self._on_timeout, search_id)
+
+        self._search_for_cover(coverobject, search_id)
+
     def _search_for_cover(self, coverobject, search_id):
         '''
         Actively requests a cover to the cover_db, calling
@@ -1386,21 +3047,72 @@ class CoverRequester(GObject.Object):
         provides = self._cover_db.request(key, self._next, search_id)
 
         if not provides:
-            # in case there is no provider, call the callback immediately
+            # in case there is no provider, call the callback immediately;
+            # it isn't recorded as a miss
+            self._in_flight[search_id] = (self._in_flight[search_id][0],
+                                          None)
             self._next(search_id)
 
     def _next(self, *args):
-        ''' Advances to the next coverobject to process. '''
+        ''' Finishes a request and advances to the next coverobject. '''
         # get the id of the search
         search_id = args[-1]
-        if search_id == self._queue_id:
-            # only process the next element if the search_id is the same as
-            # the current id. Otherwise, this is a invalid call
+        request = self._in_flight.pop(search_id, None)
+
+        if request is None:
+            # the search already finished or timed out, this is a invalid
+            # call
+            return
+
+        started, coverobject = request
+
+        # the request callback gets (key, [store_key,] filename, data,
+        # user_data); a miss has neither a file nor any data
+        if coverobject and len(args) > 2 and not args[-2] and not args[-3]:
+            self._misses.add(coverobject.create_ext_db_key(), self._providers)
+
+        # keep the timeout at a few times the usual response time
+        elapsed = GLib.get_monotonic_time() // 1000 - started
+
+        if self._response_time is None:
+            self._response_time = elapsed
+        else:
+            self._response_time = (self._response_time * 3 + elapsed) // 4
+
+        self._timeout = min(self.MAX_TIMEOUT,
+                            max(self.MIN_TIMEOUT, self._response_time * 4))
+        self._backoff = max(1, self._backoff // 2)
+
+        self._process_queue()
+
+    def _on_timeout(self, search_id):
+        if self._in_flight.pop(search_id, None) is not None:
+            # the providers are slow or failing, wait longer for them and
+            # slow down the requests
+            self._timeout = min(self.MAX_TIMEOUT, self._timeout * 2)
+            self._backoff = min(16, self._backoff * 2)
+
             self._process_queue()
 
+        return False
+
     def stop(self):
-        ''' Clears the queue, forcing the requester to stop. '''
-        del self._queue[:]
+        '''
+        Clears the queue and ends the process straight away, so a new one
+        can start with its own callback. The requests in flight still store
+        the covers they find, but they're no longer tracked.
+        '''
+        self._clear_queue()
+        self._in_flight.clear()
+
+        if self._dispatch_id:
+            GLib.source_remove(self._dispatch_id)
+            self._dispatch_id = None
+
+        if self._running:
+            self._running = False
+            self._misses.save()
+            self._callback(None)
 
 
 class CoverManager(GObject.Object):
@@ -1417,16 +3129,72 @@ class CoverManager(GObject.Object):
         'load-finished': (GObject.SIGNAL_RUN_LAST, None, ())
     }
 
+    # pixbuf cache shared by every cover manager, and the share of its
+    # budget given to the covers of each manager
+    pixbuf_cache = None
+    pixbuf_budget_share = 1.0
+
+    # file where the cover searches that found nothing are recorded
+    search_misses_file = 'search_misses.json'
+
     # properties
     has_finished_loading = False
     force_lastfm_check = False
     cover_size = GObject.property(type=int, default=0)
+    load_on_demand = GObject.property(type=bool, default=False)
 
     def __init__(self, plugin, manager):
         super(CoverManager, self).__init__()
         # self.cover_db = None to be defined by inherited class
         self._manager = manager
-        self._requester = CoverRequester(self.cover_db)
+
+        gs = GSetting()
+        ttl = gs.get_value(gs.Path.PLUGIN,
+                           gs.PluginKey.COVER_SEARCH_MISS_TTL) * 24 * 60 * 60
+        self._requester = CoverRequester(
+            self.cover_db, SearchMissCache(self.search_misses_file, ttl))
+
+        # covers are decoded and scaled by a pool of worker threads
+        workers = gs.get_value(gs.Path.PLUGIN,
+                               gs.PluginKey.COVER_DECODE_WORKERS)
+        self._decode_pool = WorkerPool(workers)
+        self._decoding = {}
+        self._refilling = set()
+
+        # art locations are looked up in batches on the main loop, since the
+        # cover_db isn't meant to be used from other threads
+        self._lookups = 0
+        self._loading_covers = False
+
+        # increased when the loads are cancelled, so the batches queued
+        # before are dropped
+        self._load_generation = 0
+
+        # scaled covers are kept on disk to skip decoding them again
+        cache_size = gs.get_value(gs.Path.PLUGIN,
+                                  gs.PluginKey.THUMBNAIL_CACHE_SIZE)
+        self._thumbnails = ThumbnailCache(cache_size * 1024 * 1024) \
+            if cache_size > 0 else None
+
+        # decoded covers are kept on a memory bounded cache
+        budget = gs.get_value(gs.Path.PLUGIN,
+                              gs.PluginKey.PIXBUF_CACHE_SIZE) * 1024 * 1024
+
+        if not CoverManager.pixbuf_cache:
+            CoverManager.pixbuf_cache = PixbufCache(budget)
+
+        # the manager's covers are kept on their own groups of the cache
+        self._cache_owner = type(self).__name__
+        self._pixbuf_cache = self.pixbuf_cache.owned_by(self._cache_owner)
+        self._pixbuf_budget = int(budget * self.pixbuf_budget_share)
+        self._budget_width = None
+
+        # covers are shared between the coverobjects whose art is the same
+        # file; they're looked up by the art's resolved path and the variant
+        # of the cover (size, shadow...)
+        self._shared_covers = weakref.WeakValueDictionary()
+        self._pending_decodes = {}
+        self.collapsed_covers = 0
 
         self.unknown_cover = None  #to be defined by inherited class
         self.album_manager = None  #to be defined by inherited class
@@ -1439,41 +3207,288 @@ class CoverManager(GObject.Object):
     def _on_load_finished(self, *args):
         self.has_finished_loading = True
 
-    @idle_iterator
-    def _load_covers(self):
-        def process(coverobject, data):
-            self.load_cover(coverobject)
+    def _decode_cover(self, coverobject, image):
+        '''
+        Queues the decoding of a cover image on the worker pool. Once it's
+        decoded, the cover is assigned to the coverobject on the main loop.
+        Any previous decoding for the same coverobject is discarded.
 
-        def finish(data):
+        If a cover of the same file and variant is already in use, it's
+        shared instead of decoding the image again; the same goes for an
+        image that's already being decoded.
+        '''
+        variant = self.cover_variant()
+        shared_key = (os.path.realpath(image), variant)
+        shared = self._shared_covers.get(shared_key)
+
+        if shared:
+            self._decoding.pop(coverobject, None)
+            self.collapsed_covers += 1
+            coverobject.cover = shared
+            self._check_load_finished()
+            return
+
+        ticket = object()
+        self._decoding[coverobject] = ticket
+
+        waiting = self._pending_decodes.get(shared_key)
+
+        if waiting is not None:
+            waiting.append((coverobject, ticket, image))
+            return
+
+        self._pending_decodes[shared_key] = [(coverobject, ticket, image)]
+
+        self._decode_pool.submit(self.cover_decoder(image),
+                                 self._cover_decoded, image, shared_key)
+
+    def _cover_decoded(self, pixbuf, image, shared_key):
+        waiting = self._pending_decodes.pop(shared_key, [])
+
+        if pixbuf:
+            cover = self.create_cover(image, pixbuf)
+            self._shared_covers[shared_key] = cover
+        else:
+            cover = self.unknown_cover
+
+        assigned = 0
+
+        for coverobject, ticket, _ in waiting:
+            if self._decoding.get(coverobject) is not ticket:
+                # a newer request superseded this one
+                continue
+
+            del self._decoding[coverobject]
+            coverobject.cover = cover
+            assigned += 1
+
+        if cover is not self.unknown_cover and assigned > 1:
+            self.collapsed_covers += assigned - 1
+
+        self._check_load_finished()
+
+    def _refill_cover(self, cover):
+        '''
+        Queues the decoding of a cover which pixbuf was evicted from the
+        cache. Meanwhile, the cover shows the unknown cover's pixbuf.
+        '''
+        if cover not in self._refilling:
+            self._refilling.add(cover)
+            self._decode_pool.submit(self.cover_decoder(cover.original),
+                                     self._cover_refilled, cover,
+                                     self.cover_variant())
+
+        return self.unknown_cover.pixbuf
+
+    def _cover_refilled(self, pixbuf, cover, variant):
+        if cover not in self._refilling:
+            # the refill was cancelled
+            return
+
+        self._refilling.discard(cover)
+
+        if pixbuf and variant == self.cover_variant():
+            cover.pixbuf = pixbuf
+            cover.emit('resized')
+
+    def _check_load_finished(self):
+        if self._loading_covers and not self._lookups and not self._decoding:
+            self._loading_covers = False
             self.album_manager.progress = 1
             gc.collect()
+
+            print("CoverArtBrowser DEBUG - %d duplicated covers shared" %
+                  self.collapsed_covers)
+
             self.emit('load-finished')
 
+    def cancel_cover_loads(self):
+        '''
+        Discards every cover waiting to be decoded.
+        '''
+        self._lookups = 0
+        self._load_generation += 1
+        self._decode_pool.cancel()
+        self._decoding.clear()
+        self._pending_decodes.clear()
+        self._refilling.clear()
+
+    def cancel_decodes(self):
+        '''
+        Discards the covers being decoded and queues them again, so they're
+        decoded with the current variant. The lookups still pending are kept.
+        '''
+        pending = [(coverobject, image)
+                   for waiting in self._pending_decodes.values()
+                   for coverobject, ticket, image in waiting
+                   if self._decoding.get(coverobject) is ticket]
+
+        self._decode_pool.cancel()
+        self._decoding.clear()
+        self._pending_decodes.clear()
+        self._refilling.clear()
+
+        for coverobject, image in pending:
+            self._decode_cover(coverobject, image)
+
+    def shutdown(self):
+        '''
+        Discards every cover load and stops the worker threads.
+        '''
+        self.cancel_cover_loads()
+        self._decode_pool.shutdown()
+
+    def _update_pixbuf_budget(self, width):
+        '''
+        Gives the manager's share of the pixbuf cache to the covers of the
+        given width, dropping the ones cached for the previous width.
+        '''
+        if self._budget_width is not None and self._budget_width != width:
+            self.pixbuf_cache.forget(self._budget_width, self._cache_owner)
+
+        self._budget_width = width
+        self.pixbuf_cache.set_budget(width, self._pixbuf_budget,
+                                     self._cache_owner)
+
+    def create_placeholder(self, image):
+        '''
+        Creates a cover for the given image that shows the unknown cover's
+        pixbuf until it's requested with `request_covers`.
+        '''
+        cover = self.create_cover(image, self.unknown_cover.pixbuf,
+                                  cached=False)
+        cover.loaded = False
+
+        return cover
+
+    def request_covers(self, coverobjects):
+        '''
+        Decodes the covers of the given coverobjects that only hold a
+        placeholder, or which pixbuf was evicted from the cache. The decoding
+        is queued following the given order.
+
+        :param coverobjects: iterable of objects which cover is needed.
+        '''
+        for coverobject in coverobjects:
+            cover = coverobject.cover
+
+            if not cover.loaded:
+                if coverobject not in self._decoding:
+                    self._decode_cover(coverobject, cover.original)
+            elif not cover.cached:
+                self._refill_cover(cover)
+
+    def release_covers(self, coverobjects):
+        '''
+        Replaces the covers of the given coverobjects with placeholders,
+        freeing their pixbufs.
+
+        :param coverobjects: iterable of objects which cover isn't needed.
+        '''
+        for coverobject in coverobjects:
+            cover = coverobject.cover
+            self._decoding.pop(coverobject, None)
+
+            if cover.loaded and cover is not self.unknown_cover:
+                coverobject.cover = self.create_placeholder(cover.original)
+
+    @idle_iterator
+    def _load_covers(self):
+        def process(coverobjects, data):
+            if data['generation'] != self._load_generation:
+                # the load was cancelled
+                return
+
+            # the batch is no longer pending, even if the lookup fails
+            self._lookups -= 1
+
+            batch = [(coverobject, coverobject.create_ext_db_key())
+                     for coverobject in coverobjects]
+            locations = self.lookup_art_locations([key for _, key in batch])
+
+            for coverobject, key in batch:
+                self._assign_cover(coverobject, locations.get(key))
+
+            data['progress'] += len(batch)
+            self._check_load_finished()
+
+        def finish(data):
+            if data['complete']:
+                self.finish_cover_loads()
+
         def error(exception):
             print('Error while loading covers: ' + str(exception))
 
         def after(data):
-            data['progress'] += COVER_LOAD_CHUNK
-
             # update the progress
-            self.album_manager.progress = data['progress'] / data['total']
+            if data['complete']:
+                self.album_manager.progress = data['progress'] / data['total']
 
-        return COVER_LOAD_CHUNK, process, after, error, finish
+        return 1, process, after, error, finish
+
+    def lookup_art_locations(self, keys):
+        '''
+        Looks up the art locations of the given keys on the cover_db. It
+        returns a dict of key -> art location with the keys that have art.
+
+        :param keys: `list` of `RB.ExtDBKey` to look up.
+        '''
+        locations = {}
+
+        for key in keys:
+            art_location = self.cover_db.lookup(key)
+
+            if art_location and not isinstance(art_location, str):
+                # RB 3.2 returns a tuple (path, key)
+                art_location = art_location[0]
+
+            if art_location:
+                locations[key] = art_location
+
+        return locations
 
     def create_unknown_cover(self, plugin):
         # set the unknown cover to the requester to make comparisons
         self._requester.unknown_cover = self.unknown_cover
 
-    def create_cover(self, image):
-        return Cover(self.cover_size, image)
+    def create_cover(self, image, pixbuf=None, cached=True):
+        cache = self._pixbuf_cache if cached else None
+
+        cover = Cover(self.cover_size, image, pixbuf, cache, self._thumbnails)
+
+        if cached:
+            cover.refill = self._refill_cover
+
+        return cover
+
+    def cover_decoder(self, image):
+        '''
+        Returns a callable that creates the pixbuf for a cover of the given
+        image, suitable to be run on a worker thread.
+        '''
+        return Cover.decoder(self.cover_size, image, self._thumbnails)
+
+    def cover_variant(self):
+        '''
+        Returns a hashable value describing how the covers are currently
+        rendered. Covers can only be shared within the same variant.
+        '''
+        return self.cover_size
 
     def coverart_added_callback(self, ext_db, key, path, pixbuf):
         # use the name to get the album and update it's cover
         if pixbuf:
+            # the art on the path may have been replaced
+            real_path = os.path.realpath(path)
+
+            for shared_key in list(self._shared_covers.keys()):
+                if shared_key[0] == real_path:
+                    self._shared_covers.pop(shared_key, None)
+
             coverobject = self._manager.model.get_from_ext_db_key(key)
 
             if coverobject:
-                coverobject.cover = self.create_cover(path)
+                self._decode_cover(coverobject, path)
 
     def load_cover(self, coverobject):
         '''
@@ -1486,28 +3501,67 @@ class CoverManager(GObject.Object):
         '''
         # create a key and look for the art location
         key = coverobject.create_ext_db_key()
-        art_location = self.cover_db.lookup(key)
+        locations = self.lookup_art_locations([key])
 
-        if art_location and not isinstance(art_location, str):
-            # RB 3.2 returns a tuple (path, key)
-            art_location = art_location[0]
+        self._assign_cover(coverobject, locations.get(key))
 
-        # try to create a cover
-        if art_location:
-            coverobject.cover = self.create_cover(art_location)
+    def _assign_cover(self, coverobject, art_location):
+        '''
+        Gives a coverobject the cover for the given art location, or the
+        unknown cover if there isn't one.
+        '''
+        if art_location and self.load_on_demand:
+            # the view will request it once it's about to be shown
+            self._decoding.pop(coverobject, None)
+            coverobject.cover = self.create_placeholder(art_location)
+        elif art_location:
+            self._decode_cover(coverobject, art_location)
         else:
+            self._decoding.pop(coverobject, None)
             coverobject.cover = self.unknown_cover
 
-    def load_covers(self):
+    def load_covers(self, coverobjects=None):
         '''
-        Loads all the covers for the model's albums.
+        Loads all the covers for the model's albums, or only the ones of the
+        given coverobjects.
+        Loading the covers of some coverobjects keeps the loads already going
+        on, so it can be used while the coverobjects are being added to the
+        model; `finish_cover_loads` should be called once all of them are.
+
+        :param coverobjects: `list` of objects which cover should be loaded.
         '''
-        # get all the coverobjects
-        coverobjects = self._manager.model.get_all()
+        complete = coverobjects is None
+
+        if complete:
+            self.cancel_cover_loads()
 
-        self._load_covers(iter(coverobjects), total=len(coverobjects), progress=0.)
+            # get all the coverobjects
+            coverobjects = list(self._manager.model.get_all())
 
-    def search_covers(self, coverobjects=None, callback=lambda *_: None):
+        # split them on lookup batches, small enough to keep each idle call
+        # short since the lookups are done on the main loop
+        batches = [coverobjects[i:i + COVER_LOAD_CHUNK]
+                   for i in range(0, len(coverobjects), COVER_LOAD_CHUNK)]
+
+        # the batches are counted as soon as they're queued, so the load
+        # can't be considered finished while some of them wait to be
+        # looked up
+        self._lookups += len(batches)
+
+        self._load_covers(iter(batches), total=len(coverobjects), progress=0.,
+                          complete=complete,
+                          generation=self._load_generation)
+
+    def finish_cover_loads(self):
+        '''
+        Informs that no more covers will be loaded, so the load finishes once
+        the ones still being looked up and decoded are assigned.
+        '''
+        self._loading_covers = True
+        self._check_load_finished()
+
+    def search_covers(self, coverobjects=None, callback=lambda *_: None,
+                      force=None):
         '''
         Request all the albums' covers, one by one, periodically calling a
         callback to inform the status of the process.
@@ -1515,9 +3569,15 @@ class CoverManager(GObject.Object):
         being requested. When the argument passed is None, it means the
         process has finished.
 
+        Albums whose cover was searched recently without success are skipped
+        unless forced. By default only the explicitly given albums are
+        forced.
+
         :param albums: `list` of `Album` for which look for covers.
         :param callback: `callable` to periodically inform when an album's
             cover is being searched.
+        :param force: `bool` whether to search the albums even if a recent
+            search didn't find their cover.
         '''
         if not check_lastfm(self.force_lastfm_check):
             # display error message and quit
@@ -1534,9 +3594,20 @@ class CoverManager(GObject.Object):
 
         if coverobjects is None:
             self._requester.replace_queue(
-                list(self._manager.model.get_all()), callback)
+                self._manager.model.get_all(), callback, force=bool(force))
         else:
-            self._requester.add_to_queue(coverobjects, callback)
+            # explicitly selected coverobjects go ahead of a bulk search
+            self._requester.add_to_queue(coverobjects, callback,
+                                         priority=True,
+                                         force=force is not False)
+
+    def prioritize_searches(self, coverobjects):
+        '''
+        Moves the given coverobjects ahead on the cover search queue, if
+        they're waiting to be searched. Used to search the visible
+        coverobjects first.
+        '''
+        self._requester.prioritize(coverobjects)
 
     def cancel_cover_request(self):
         '''
@@ -1595,6 +3666,8 @@ class AlbumCoverManager(CoverManager):
     add_shadow = GObject.property(type=bool, default=False)
     shadow_image = GObject.property(type=str, default="above")
 
+    search_misses_file = 'album_search_misses.json'
+
     def __init__(self, plugin, album_manager):
         self.cover_db = RB.ExtDB(name='album-art')
         super(AlbumCoverManager, self).__init__(plugin, album_manager)
@@ -1605,6 +3678,7 @@ class AlbumCoverManager(CoverManager):
 
         # create unknown cover and shadow for covers
         self.create_unknown_cover(plugin)
+        self._update_pixbuf_budget(self.cover_size)
 
     def _connect_signals(self, plugin):
         self.connect('notify::cover-size', self._on_cover_size_changed)
@@ -1629,18 +3703,35 @@ class AlbumCoverManager(CoverManager):
                               rb.find_plugin_file(plugin, 'img/album-shadow-%s.png' %
                                                   self.shadow_image))
         self.unknown_cover = self.create_cover(
-            rb.find_plugin_file(plugin, 'img/rhythmbox-missing-artwork.svg'))
+            rb.find_plugin_file(plugin, 'img/rhythmbox-missing-artwork.svg'),
+            cached=False)
 
         super(AlbumCoverManager, self).create_unknown_cover(plugin)
 
-    def create_cover(self, image):
+    def create_cover(self, image, pixbuf=None, cached=True):
+        cache = self._pixbuf_cache if cached else None
+
         if self.add_shadow:
-            cover = ShadowedCover(self._shadow, image)
+            cover = ShadowedCover(self._shadow, image, pixbuf, cache,
+                                  self._thumbnails)
         else:
-            cover = Cover(self.cover_size, image)
+            cover = Cover(self.cover_size, image, pixbuf, cache,
+                          self._thumbnails)
+
+        if cached:
+            cover.refill = self._refill_cover
 
         return cover
 
+    def cover_decoder(self, image):
+        if self.add_shadow:
+            return ShadowedCover.decoder(self._shadow, image, self._thumbnails)
+
+        return Cover.decoder(self.cover_size, image, self._thumbnails)
+
+    def cover_variant(self):
+        return self.cover_size, self.add_shadow, self.shadow_image
+
     def _on_add_shadow_changed(self, obj, prop, plugin):
         # update the unknown_cover
         self.create_unknown_cover(plugin)
@@ -1652,12 +3743,19 @@ class AlbumCoverManager(CoverManager):
         '''
         Updates the showing albums cover size.
         '''
-        # update the shadow
+        # update the shadow and the cache budget for the new size
         self._shadow.resize(self.cover_size)
+        self._update_pixbuf_budget(self.cover_size)
 
         # update coverview item width
         self.update_item_width()
 
+        # resize the shared unknown cover and decode again the covers still
+        # being decoded at the old size; the pending lookups go on, since
+        # their covers are decoded at the new size
+        self.unknown_cover.resize(self.cover_size)
+        self.cancel_decodes()
+
         # update the album's covers
         albums = self.album_manager.model.get_all()
 
@@ -1684,11 +3782,19 @@ class AlbumCoverManager(CoverManager):
     @idle_iterator
     def _resize_covers(self):
         def process(coverobject, data):
-            coverobject.cover.resize(self.cover_size)
+            cover = coverobject.cover
+
+            if cover is self.unknown_cover:
+                return
+
+            if self.load_on_demand or not cover.loaded:
+                coverobject.cover = self.create_placeholder(cover.original)
+            else:
+                self._decode_cover(coverobject, cover.original)
 
         def finish(data):
-            self.album_manager.progress = 1
-            self.emit('load-finished')
+            self._loading_covers = True
+            self._check_load_finished()
 
         def error(exception):
             print("Error while resizing covers: " + str(exception))
@@ -1720,6 +3826,13 @@ class TextManager(GObject.Object):
         self._album_manager = album_manager
         self._current_view = self._album_manager.current_view
 
+        # texts are generated when a row is drawn or hovered, and remembered
+        # with the album's revision and the version of the text settings they
+        # were made with, so a settings change just bumps the version
+        self._settings_version = 0
+        self._tooltips = weakref.WeakKeyDictionary()
+        self._markups = weakref.WeakKeyDictionary()
+
         # connect properties and signals
         self._connect_signals()
         self._connect_properties()
@@ -1761,9 +3874,34 @@ class TextManager(GObject.Object):
         Callback called when one of the properties related with the ellipsize
         option is changed.
         '''
+        self._settings_version += 1
         self._album_manager.model.recreate_text()
 
+    def _memoized(self, texts, album, version, generate):
+        text = texts.get(album)
+
+        if text and text[0] == (album.revision, version):
+            return text[1]
+
+        value = generate(album)
+        texts[album] = ((album.revision, version), value)
+
+        return value
+
     def _generate_tooltip(self, model, album):
+        '''
+        Returns the tooltip for this album, creating it if it's outdated.
+        '''
+        return self._memoized(self._tooltips, album, 0, self._create_tooltip)
+
+    def _generate_markup_text(self, model, album):
+        '''
+        Returns the markup text for this album, creating it if it's outdated.
+        '''
+        return self._memoized(self._markups, album, self._settings_version,
+                              self._create_markup_text)
+
+    def _create_tooltip(self, album):
         '''
         Utility function that creates the tooltip for this album to set into
         the model.
@@ -1771,7 +3909,7 @@ class TextManager(GObject.Object):
         return cgi.escape(rb3compat.unicodeencode(_('%s by %s'), 'utf-8') % (album.name,
                                                                              album.artists))
 
-    def _generate_markup_text(self, model, album):
+    def _create_markup_text(self, album):
         '''
         Utility function that creates the markup text for this album to set
         into the model.
@@ -1857,6 +3995,17 @@ class AlbumManager(GObject.Object):
         if not toolbar_type or toolbar_type == "album":
             self.model.sort()
 
+    def shutdown(self):
+        '''
+        Frees the resources that aren't released along with the manager,
+        like the threads of the cover managers, and saves the album index.
+        '''
+        self.loader.shutdown()
+        self.cover_man.shutdown()
+        self.artist_man.cover_man.shutdown()
+
     def _load_finished_callback(self, *args):
         self.artist_man.loader.load_artists()
-        self.cover_man.load_covers()
+
+        # the covers started to load as the albums were added to the model
+        self.cover_man.finish_cover_loads()
@@ -89,12 +89,12 @@ class Artist(GObject.Object):
 
     @cover.setter
     def cover(self, new_cover):
-        # if self._cover:
-        #    self._cover.disconnect(self._cover_resized_id)
+        if self._cover:
+            self._cover.disconnect(self._cover_resized_id)
 
         self._cover = new_cover
-        #self._cover_resized_id = self._cover.connect('resized',
-        #    lambda *args: self.emit('cover-updated'))
+        self._cover_resized_id = self._cover.connect('resized',
+                                                     lambda *args: self.emit('cover-updated'))
 
         self.emit('cover-updated')
 
@@ -113,7 +113,8 @@ class ArtistsModel(GObject.Object):
 
     The `Gtk.TreeModel` haves the following structure:
     column 0 -> string containing the artist name
-    column 1 -> pixbuf of the artist's cover.
+    column 1 -> unused, the covers are drawn from the artist or album so
+                their pixbufs are only held by the pixbuf cache.
     column 2 -> instance of the artist or album itself.
     column 3 -> boolean that indicates if the row should be shown
     column 4 -> blank text column to pad the view correctly
@@ -234,10 +235,8 @@ class ArtistsModel(GObject.Object):
 
         if self._tree_store.iter_is_valid(tree_iter):
             # only update if the iter is valid
-            pixbuf = artist.cover.pixbuf
-
-            self._tree_store.set_value(tree_iter, self.columns['pixbuf'],
-                                       pixbuf)
+            self._tree_store.row_changed(self._tree_store.get_path(tree_iter),
+                                         tree_iter)
 
             self._emit_signal(tree_iter, 'visual-updated')
 
@@ -269,8 +268,12 @@ class ArtistsModel(GObject.Object):
         if 'dummy_iter' in self._iters[artist.name]:
             self._iters[artist.name]['album'] = []
 
+        added = []
+
         for album in albums:
             if artist.name == album.artist and not (album in self._albumiters):
+                added.append(album)
+
                 # now for all matching albums that were found lets add to the model
 
                 # generate necessary values
@@ -292,6 +295,9 @@ class ArtistsModel(GObject.Object):
             self._tree_store.remove(self._iters[artist.name]['dummy_iter'])
             del self._iters[artist.name]['dummy_iter']
 
+        # covers may only be loaded on demand by the cover view
+        self.album_manager.cover_man.request_covers(added)
+
         self.sort()  # ensure the added albums are sorted correctly
 
     def _album_modified(self, album):
@@ -345,13 +351,13 @@ class ArtistsModel(GObject.Object):
             self._on_album_filter_changed(_)
 
     def _album_coverupdate(self, album):
-        tooltip, pixbuf, album, show, blank, markup, empty = self._generate_album_values(album)
-        self._tree_store.set_value(self._albumiters[album]['iter'],
-                                   self.columns['pixbuf'], pixbuf)
+        tree_iter = self._albumiters[album]['iter']
+        self._tree_store.row_changed(self._tree_store.get_path(tree_iter),
+                                     tree_iter)
 
     def _generate_artist_values(self, artist):
         tooltip = artist.name
-        pixbuf = artist.cover.pixbuf
+        pixbuf = None
         show = True
 
         return tooltip, pixbuf, artist, show, '', \
@@ -359,7 +365,7 @@ class ArtistsModel(GObject.Object):
 
     def _generate_album_values(self, album):
         tooltip = album.name
-        pixbuf = album.cover.pixbuf.scale_simple(48, 48, GdkPixbuf.InterpType.BILINEAR)
+        pixbuf = None
         show = True
 
         rating = album.rating
@@ -677,6 +683,8 @@ class ArtistLoader(GObject.Object):
 
 class ArtistCoverManager(CoverManager):
     force_lastfm_check = True
+    pixbuf_budget_share = 0.25
+    search_misses_file = 'artist_search_misses.json'
 
     def __init__(self, plugin, artist_manager):
         self.cover_db = CoverArtExtDB(name='artist-art')
@@ -687,11 +695,13 @@ class ArtistCoverManager(CoverManager):
 
         # create unknown cover and shadow for covers
         self.create_unknown_cover(plugin)
+        self._update_pixbuf_budget(self.cover_size)
 
     def create_unknown_cover(self, plugin):
         # create the unknown cover
         self.unknown_cover = self.create_cover(
-            rb.find_plugin_file(plugin, 'img/microphone.png'))
+            rb.find_plugin_file(plugin, 'img/microphone.png'),
+            cached=False)
 
         super(ArtistCoverManager, self).create_unknown_cover(plugin)
 
@@ -817,7 +827,8 @@ class ArtistView(Gtk.TreeView, AbstractView):
         self.append_column(col)
 
         pixbuf = Gtk.CellRendererPixbuf()
-        col = Gtk.TreeViewColumn(_('Covers'), pixbuf, pixbuf=1)
+        col = Gtk.TreeViewColumn(_('Covers'), pixbuf)
+        col.set_cell_data_func(pixbuf, self._cover_data_func)
 
         self.append_column(col)
 
@@ -885,6 +896,18 @@ class ArtistView(Gtk.TreeView, AbstractView):
         self.get_selection().connect('changed', self._selection_changed)
         self.connect('query-tooltip', self._query_tooltip)
 
+    def _cover_data_func(self, column, cell, model, tree_iter, *args):
+        # the pixbuf is taken from the cover each time the row is drawn, so
+        # it's only held by the pixbuf cache and may be evicted
+        artist_album = model[tree_iter][ArtistsModel.columns['artist_album']]
+        pixbuf = artist_album.cover.pixbuf
+
+        if isinstance(artist_album, Album):
+            pixbuf = pixbuf.scale_simple(48, 48,
+                                         GdkPixbuf.InterpType.BILINEAR)
+
+        cell.props.pixbuf = pixbuf
+
     def _artist_sort_clicked(self, *args):
         # in the absence of an apparent way to remove the unsorted default_sort_func
         # find out if we are now in an unsorted state - if we are
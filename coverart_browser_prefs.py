@@ -173,7 +173,14 @@ class GSetting:
                 ENTRY_VIEW_MODE='entry-view-mode',
                 FOLLOWING='following',
                 ACTIVATIONS='activations',
-                TEXT_ALIGNMENT='text-alignment')
+                TEXT_ALIGNMENT='text-alignment',
+                COVER_DECODE_WORKERS='cover-decode-workers',
+                THUMBNAIL_CACHE_SIZE='thumbnail-cache-size',
+                COVER_PREFETCH_MARGIN='cover-prefetch-margin',
+                PIXBUF_CACHE_SIZE='pixbuf-cache-size',
+                COVER_SEARCH_PARALLEL='cover-search-parallel',
+                COVER_SEARCH_INTERVAL='cover-search-interval',
+                COVER_SEARCH_MISS_TTL='cover-search-miss-ttl')
 
             self.setting = {}
 
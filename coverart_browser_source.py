@@ -149,6 +149,20 @@ class CoverArtBrowserSource(RB.Source):
 
         print("CoverArtBrowser DEBUG - end do_selected")
 
+    def do_delete_thyself(self):
+        '''
+        Called by Rhythmbox when the source is removed (e.g. when the plugin
+        is deactivated). It stops the threads used to load the covers.
+        '''
+        print("CoverArtBrowser DEBUG - do_delete_thyself")
+
+        if self.hasActivated:
+            self.album_manager.shutdown()
+
+        RB.Source.do_delete_thyself(self)
+
+        print("CoverArtBrowser DEBUG - end do_delete_thyself")
+
     def do_impl_activate(self):
         '''
         Called by do_selected the first time the source is activated.
@@ -1101,6 +1115,7 @@ class Statusbar(GObject.Object):
         super(Statusbar, self).__init__()
 
         self.status = ''
+        self._metadata = source.album_manager.model.metadata
 
         self._source_statusbar = SourceStatusBar(source)
         self._custom_statusbar = CustomStatusBar(source.status_label)
@@ -1136,13 +1151,21 @@ class Statusbar(GObject.Object):
         self.status = ''
 
         if albums:
-            track_count = 0
-            duration = 0
+            totals = self._metadata.totals(albums) if self._metadata else None
+
+            if totals:
+                track_count, duration = totals
+                duration /= 60
+            else:
+                track_count = 0
+                duration = 0
+
+                for album in albums:
+                    # Calculate duration and number of tracks from that album
+                    track_count += album.track_count
+                    duration += album.duration / 60
 
-            for album in albums:
-                # Calculate duration and number of tracks from that album
-                track_count += album.track_count
-                duration += album.duration / 60
+            album = albums[-1]
 
             # now lets build up a status label containing some
             # 'interesting stuff' about the album
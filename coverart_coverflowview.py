@@ -244,6 +244,7 @@ class CoverFlowView(AbstractView):
         #self.album_manager.model.connect('visual-updated', self.flow.update_album, self.view)
         self.album_manager.model.connect('album-updated', self.filter_changed)
         self.album_manager.model.connect('visual-updated', self.filter_changed)
+        self.album_manager.model.connect('text-updated', self.filter_changed)
         self.album_manager.model.connect('filter-changed', self.filter_changed)
 
         self.filter_changed()
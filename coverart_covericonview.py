@@ -40,6 +40,9 @@ import rb
 PLAY_SIZE_X = 30
 PLAY_SIZE_Y = 30
 
+# covers further than this many prefetch margins from the viewport are freed
+COVER_RELEASE_FACTOR = 3
+
 
 class CellRendererThumb(Gtk.CellRendererPixbuf):
     markup = GObject.property(type=str, default="")
@@ -202,6 +205,8 @@ class AlbumShowingPolicy(GObject.Object):
         self._cover_view = cover_view  # this will need to be reworked for all views
         self._visible_paths = None
         self._has_initialised = False
+        self._loaded_albums = set()
+        self._load_covers_id = None
 
     def initialise(self, album_manager):
         if self._has_initialised:
@@ -209,6 +214,13 @@ class AlbumShowingPolicy(GObject.Object):
 
         self._album_manager = album_manager
         self._model = album_manager.model
+
+        # covers are only decoded when they get close to the viewport
+        gs = GSetting()
+        self._prefetch_margin = gs.get_value(
+            gs.Path.PLUGIN, gs.PluginKey.COVER_PREFETCH_MARGIN)
+        album_manager.cover_man.load_on_demand = True
+
         self._connect_signals()
         self._has_initialised = True
 
@@ -217,8 +229,74 @@ class AlbumShowingPolicy(GObject.Object):
                                                    self._viewport_changed)
         self._model.connect('album-updated', self._album_updated)
         self._model.connect('visual-updated', self._album_updated)
+        self._model.connect('text-updated', self._text_updated)
+        self._model.connect('filter-changed', self._queue_load_covers)
+        self._album_manager.cover_man.connect('load-finished',
+                                              self._queue_load_covers)
+
+    def _queue_load_covers(self, *args):
+        # coalesce the bursts of viewport changes while scrolling
+        if not self._load_covers_id:
+            self._load_covers_id = Gdk.threads_add_timeout(
+                GLib.PRIORITY_DEFAULT_IDLE, 50, self._load_covers, None)
+
+    def _load_covers(self, *args):
+        '''
+        Requests the covers of the visible albums followed by the ones on the
+        prefetch margin around them, and frees the covers of the albums that
+        are far away from the viewport.
+        '''
+        self._load_covers_id = None
+        visible_range = self._cover_view.get_visible_range()
+
+        if not visible_range:
+            return False
+
+        store = self._model.store
+        album_col = AlbumsModel.columns['album']
+        first = visible_range[0].get_indices()[0]
+        last = visible_range[1].get_indices()[0]
+        total = len(store)
+
+        # visible rows first, then the margin growing outwards
+        rows = list(range(first, last + 1))
+
+        for distance in range(1, self._prefetch_margin + 1):
+            if last + distance < total:
+                rows.append(last + distance)
+
+            if first - distance >= 0:
+                rows.append(first - distance)
+
+        albums = [store[row][album_col] for row in rows]
+        self._album_manager.cover_man.request_covers(albums)
+        self._album_manager.cover_man.prioritize_searches(
+            albums[:last - first + 1])
+
+        # free the covers that are far from the viewport
+        keep = self._prefetch_margin * COVER_RELEASE_FACTOR
+        released = []
+
+        for album in self._loaded_albums:
+            try:
+                path = self._model.get_path(album)
+            except KeyError:
+                # the album isn't on the model anymore
+                path = None
+
+            if not path or not \
+                    (first - keep <= path.get_indices()[0] <= last + keep):
+                released.append(album)
+
+        self._album_manager.cover_man.release_covers(released)
+        self._loaded_albums.difference_update(released)
+        self._loaded_albums.update(albums)
+
+        return False
 
     def _viewport_changed(self, *args):
+        self._queue_load_covers()
+
         visible_range = self._cover_view.get_visible_range()
 
         if visible_range:
@@ -238,6 +316,11 @@ class AlbumShowingPolicy(GObject.Object):
 
             self._visible_paths.append(end)
 
+    def _text_updated(self, model):
+        # the texts may change their size, so the items are laid out again
+        self._cover_view.queue_resize()
+        self._cover_view.queue_draw()
+
     def _album_updated(self, model, album_path, album_iter):
         # get the currently showing paths
         if not self._visible_paths:
@@ -247,6 +330,11 @@ class AlbumShowingPolicy(GObject.Object):
             # if our path is on the viewport, emit the signal to update it
             self._cover_view.queue_draw()
 
+            if not model.get_from_path(album_path).cover.loaded:
+                # the album got a cover to be loaded while being shown (e.g.
+                # while the albums are still being added)
+                self._queue_load_covers()
+
 
 class CoverIconView(EnhancedIconView, AbstractView):
     __gtype_name__ = "CoverIconView"
@@ -14,11 +14,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
 
-from bisect import bisect_left, bisect_right
+from bisect import bisect_left
 import collections
 import re
 import logging
 import sys
+import os
+import threading
+import queue
 from collections import namedtuple
 
 from gi.repository import GdkPixbuf
@@ -157,8 +160,11 @@ class SortedCollection(object):
     length lookup, clearing, copying, forward and reverse iteration, contains
     checking, item counts, item removal, and a nice looking repr.
 
-    Finding and indexing are O(log n) operations while iteration and insertion
-    are O(n).  The initial sort is O(n log n).
+    Items are kept on blocks of bounded size, so finding, indexing, insertion,
+    removal and reordering are O(log n) operations (plus a block sized list
+    insertion), while iteration is O(n). The initial sort is O(n log n). Items
+    are located by identity, so an item can be reordered or removed even after
+    its key changed.
 
     The key function is stored in the 'key' attibute for easy introspection or
     so that you can assign a new key function (triggering an automatic re-sort).
@@ -205,26 +211,140 @@ class SortedCollection(object):
 
     '''
 
+    # number of items per block; blocks are split once they double it
+    LOAD = 512
+
     def __init__(self, iterable=(), key=None):
         self._given_key = key
         key = (lambda x: x) if key is None else key
-        decorated = sorted((key(item), item) for item in iterable)
-        self._keys = [k for k, item in decorated]
-        self._items = [item for k, item in decorated]
+        decorated = sorted(((key(item), item) for item in iterable),
+                           key=lambda pair: pair[0])
         self._key = key
 
+        # items and their keys are kept on blocks of up to 2 * LOAD
+        # elements, with the greatest key of each block on _maxes and the
+        # sizes of the blocks on a Fenwick tree to locate positions
+        load = self.LOAD
+        self._keys = [[k for k, item in decorated[i:i + load]]
+                      for i in range(0, len(decorated), load)]
+        self._lists = [[item for k, item in decorated[i:i + load]]
+                       for i in range(0, len(decorated), load)]
+        self._maxes = [keys[-1] for keys in self._keys]
+        self._len = len(decorated)
+
+        # key under which each item is stored, by identity, so items can be
+        # found even after their key changed
+        self._positions = dict((id(item), k) for k, item in decorated)
+
+        self._build_tree()
+
     def _getkey(self):
         return self._key
 
     def _setkey(self, key):
         if key is not self._key:
-            self.__init__(self._items, key=key)
+            self.__init__(list(self), key=key)
 
     def _delkey(self):
         self._setkey(None)
 
     key = property(_getkey, _setkey, _delkey, 'key function')
 
+    def _build_tree(self):
+        tree = [len(items) for items in self._lists]
+
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+
+            if parent < len(tree):
+                tree[parent] += tree[i]
+
+        self._tree = tree
+
+    def _update_tree(self, block, delta):
+        tree = self._tree
+
+        while block < len(tree):
+            tree[block] += delta
+            block |= block + 1
+
+    def _offset(self, block):
+        'Number of items before the given block'
+        total = 0
+        block -= 1
+
+        while block >= 0:
+            total += self._tree[block]
+            block = (block & (block + 1)) - 1
+
+        return total
+
+    def _locate(self, index):
+        'Returns the block and the position inside it of an index'
+        if index < 0:
+            index += self._len
+
+        if not 0 <= index < self._len:
+            raise IndexError('SortedCollection index out of range')
+
+        tree = self._tree
+        block = -1
+        bit = 1 << (len(tree).bit_length() - 1) if tree else 0
+
+        while bit:
+            next_block = block + bit
+
+            if next_block < len(tree) and tree[next_block] <= index:
+                block = next_block
+                index -= tree[block]
+
+            bit >>= 1
+
+        return block + 1, index
+
+    def _find(self, item):
+        'Returns the block and the position inside it of an item, or None'
+        if id(item) not in self._positions:
+            return None
+
+        k = self._positions[id(item)]
+        block = bisect_left(self._maxes, k)
+
+        while block < len(self._lists):
+            keys = self._keys[block]
+            items = self._lists[block]
+            i = bisect_left(keys, k)
+
+            while i < len(keys) and keys[i] == k:
+                if items[i] is item:
+                    return block, i
+
+                i += 1
+
+            if i < len(keys):
+                break
+
+            block += 1
+
+        return None
+
+    def _delete(self, block, i):
+        keys = self._keys[block]
+        items = self._lists[block]
+
+        del keys[i]
+        del items[i]
+        self._len -= 1
+
+        if not items:
+            del self._keys[block]
+            del self._lists[block]
+            del self._maxes[block]
+            self._build_tree()
+        else:
+            self._maxes[block] = keys[-1]
+            self._update_tree(block, -1)
+
     def clear(self):
         self.__init__([], self._key)
 
@@ -232,13 +352,20 @@ class SortedCollection(object):
         return self.__class__(self, self._key)
 
     def __len__(self):
-        return len(self._items)
+        return self._len
 
     def __getitem__(self, i):
-        return self._items[i]
+        if isinstance(i, slice):
+            return list(self)[i]
+
+        block, i = self._locate(i)
+
+        return self._lists[block][i]
 
     def __iter__(self):
-        return iter(self._items)
+        for items in self._lists:
+            for item in items:
+                yield item
 
     def __reversed__(self):
         return ReversedSortedCollection(self)
@@ -246,51 +373,82 @@ class SortedCollection(object):
     def __repr__(self):
         return '%s(%r, key=%s)' % (
             self.__class__.__name__,
-            self._items,
+            list(self),
             getattr(self._given_key, '__name__', repr(self._given_key))
         )
 
     def __reduce__(self):
-        return self.__class__, (self._items, self._given_key)
+        return self.__class__, (list(self), self._given_key)
 
     def __contains__(self, item):
-        k = self._key(item)
-        i = bisect_left(self._keys, k)
-        j = bisect_right(self._keys, k)
-        return item in self._items[i:j]
+        return id(item) in self._positions
 
     def index(self, item):
         'Find the position of an item.  Raise ValueError if not found.'
-        k = self._key(item)
-        i = bisect_left(self._keys, k)
-        j = bisect_right(self._keys, k)
-        return self._items[i:j].index(item) + i
+        found = self._find(item)
+
+        if found is None:
+            raise ValueError('%r is not in the collection' % (item,))
+
+        block, i = found
+
+        return self._offset(block) + i
 
     def count(self, item):
         'Return number of occurrences of item'
-        k = self._key(item)
-        i = bisect_left(self._keys, k)
-        j = bisect_right(self._keys, k)
-        return self._items[i:j].count(item)
+        return 1 if item in self else 0
 
     def insert(self, item):
         'Insert a new item.  If equal keys are found, add to the left'
         k = self._key(item)
-        i = bisect_left(self._keys, k)
-        self._keys.insert(i, k)
-        self._items.insert(i, item)
+        self._positions[id(item)] = k
+        self._len += 1
+
+        if not self._lists:
+            self._keys.append([k])
+            self._lists.append([item])
+            self._maxes.append(k)
+            self._build_tree()
+
+            return 0
+
+        block = bisect_left(self._maxes, k)
+
+        if block == len(self._maxes):
+            block -= 1
+
+        keys = self._keys[block]
+        items = self._lists[block]
+        i = bisect_left(keys, k)
+
+        keys.insert(i, k)
+        items.insert(i, item)
+        self._maxes[block] = keys[-1]
+
+        index = self._offset(block) + i
+
+        if len(items) > 2 * self.LOAD:
+            # split the block in half
+            half = len(items) // 2
+            self._keys.insert(block + 1, keys[half:])
+            self._lists.insert(block + 1, items[half:])
+            del keys[half:]
+            del items[half:]
+            self._maxes[block] = keys[-1]
+            self._maxes.insert(block + 1, self._keys[block + 1][-1])
+            self._build_tree()
+        else:
+            self._update_tree(block, 1)
 
-        return i
+        return index
 
     def reorder(self, item):
         '''Reorder an item. If its key changed, then the item is
         repositioned, otherwise the item stays untouched'''
-        index = self._items.index(item)
         new_index = -1
 
-        if self._keys[index] != self._key(item):
-            del self._keys[index]
-            del self._items[index]
+        if self._positions[id(item)] != self._key(item):
+            self.remove(item)
 
             new_index = self.insert(item)
 
@@ -302,9 +460,13 @@ class SortedCollection(object):
 
     def remove(self, item):
         'Remove first occurence of item.  Raise ValueError if not found'
-        i = self.index(item)
-        del self._keys[i]
-        del self._items[i]
+        found = self._find(item)
+
+        if found is None:
+            raise ValueError('%r is not in the collection' % (item,))
+
+        self._delete(*found)
+        del self._positions[id(item)]
 
 
 class ReversedSortedCollection(object):
@@ -318,11 +480,11 @@ class ReversedSortedCollection(object):
         return self.__class__(self._sorted_collection)
 
     def _getkey(self):
-        return self._key
+        return self._sorted_collection.key
 
     def _setkey(self, key):
-        if key is not self._key:
-            self.__init__(SortedCollection(self._items, key=key))
+        if key is not self._sorted_collection.key:
+            self.__init__(SortedCollection(self._sorted_collection, key=key))
 
     def _delkey(self):
         self._setkey(None)
@@ -333,23 +495,34 @@ class ReversedSortedCollection(object):
         return len(self._sorted_collection)
 
     def __getitem__(self, i):
-        return self._items[len(self) - i - 1]
+        if isinstance(i, slice):
+            return list(self)[i]
+
+        if i < 0:
+            i += len(self)
+
+        return self._sorted_collection[len(self) - i - 1]
 
     def __iter__(self):
-        return iter(reversed(self._items))
+        for items in reversed(self._sorted_collection._lists):
+            for item in reversed(items):
+                yield item
 
     def __reversed__(self):
         return self._sorted_collection
 
+    def __contains__(self, item):
+        return item in self._sorted_collection
+
     def __repr__(self):
         return '%s(%r, key=%s)' % (
             self.__class__.__name__,
-            reversed(self._items),
+            list(self),
             getattr(self._given_key, '__name__', repr(self._given_key))
         )
 
     def __reduce__(self):
-        return self.__class__, (reversed(self._items), self._given_key)
+        return self.__class__, (self._sorted_collection,)
 
     def insert(self, item):
         'Insert a new item.  If equal keys are found, add to the left'
@@ -357,6 +530,12 @@ class ReversedSortedCollection(object):
 
         return len(self) - i - 1
 
+    def reorder(self, item):
+        'Reorder an item, returning its new position or -1 if it stays'
+        i = self._sorted_collection.reorder(item)
+
+        return i if i == -1 else len(self) - i - 1
+
     def index(self, item):
         'Find the position of an item.  Raise ValueError if not found.'
         return len(self) - self._sorted_collection.index(item) - 1
@@ -412,6 +591,277 @@ def idle_iterator(func):
     return iter_function
 
 
+class WorkerPool(object):
+    '''
+    Pool of threads to run jobs (e.g. decoding and scaling images) off the
+    main loop. The result of each job is handed back to the main loop through
+    `GLib.idle_add`, so callbacks can safely touch Gtk and GObject instances.
+
+    The queue of pending jobs is bounded. Submitting a job when it's full
+    never blocks the main loop: the job waits on a backlog that is moved to
+    the queue as the workers deliver their results.
+
+    :param workers: `int` number of threads. If 0 or None, one per core is
+        used.
+    :param max_pending: `int` maximum number of jobs waiting on the queue.
+    '''
+
+    def __init__(self, workers=None, max_pending=256):
+        if not workers:
+            workers = os.cpu_count() or 1
+
+        self._queue = queue.Queue(max_pending)
+        self._backlog = collections.deque()
+        self._generation = 0
+        self._threads = []
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._work,
+                                      name='coverart-worker-%d' % i)
+            thread.daemon = True
+            thread.start()
+
+            self._threads.append(thread)
+
+    @property
+    def workers(self):
+        return len(self._threads)
+
+    def submit(self, job, callback, *args):
+        '''
+        Queues a job. Once it finishes, callback is called on the main loop
+        with the job's result followed by args. If the job raises, the
+        callback receives None as result.
+
+        :param job: `callable` without arguments to run on a worker thread.
+        :param callback: `callable` to call with the result.
+        '''
+        task = (self._generation, job, callback, args)
+
+        if self._backlog:
+            # keep the order of the jobs already waiting
+            self._backlog.append(task)
+            return
+
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            self._backlog.append(task)
+
+    def _drain_backlog(self):
+        try:
+            while self._backlog:
+                self._queue.put_nowait(self._backlog[0])
+                self._backlog.popleft()
+        except queue.Full:
+            pass
+
+    def cancel(self):
+        '''
+        Drops every pending job and discards the results of the running ones.
+        '''
+        self._generation += 1
+        self._backlog.clear()
+
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def shutdown(self):
+        '''
+        Cancels every job and stops the workers.
+        '''
+        self.cancel()
+
+        for thread in self._threads:
+            self._queue.put(None)
+
+        self._threads = []
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+
+            if task is None:
+                return
+
+            generation, job, callback, args = task
+
+            if generation != self._generation:
+                continue
+
+            try:
+                result = job()
+            except Exception as e:
+                print('Error while running a background job: ' + str(e))
+                result = None
+
+            GLib.idle_add(self._deliver, generation, callback, result, args,
+                          priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def _deliver(self, generation, callback, result, args):
+        # a worker is free, so it can take the jobs waiting on the backlog
+        self._drain_backlog()
+
+        if generation == self._generation:
+            callback(result, *args)
+
+        return False
+
+
+class PixbufCache(object):
+    '''
+    Least recently used cache of pixbufs bounded by memory. Pixbufs are
+    grouped by their owner (e.g. the cover manager of a view) and their
+    width, and each group is trimmed to its own byte budget, so the covers
+    of the different views don't push each other out, even when they have
+    the same size.
+
+    It keeps count of the hits, misses and evictions to help tuning the
+    budgets.
+
+    :param default_budget: `int` budget in bytes for the groups without an
+        explicit one.
+    '''
+
+    def __init__(self, default_budget):
+        self._default_budget = default_budget
+        self._budgets = {}
+        self._groups = {}
+        self._used = {}
+        self._keys = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_budget(self, width, budget, owner=None):
+        '''
+        Sets the budget in bytes for the owner's pixbufs of the given width.
+        '''
+        self._budgets[(owner, width)] = budget
+        self._trim((owner, width))
+
+    def forget(self, width, owner=None):
+        '''
+        Removes the budget and every pixbuf of the owner of the given width.
+        '''
+        group_key = (owner, width)
+        self._budgets.pop(group_key, None)
+
+        for key in self._groups.pop(group_key, {}):
+            del self._keys[key]
+
+        self._used.pop(group_key, None)
+
+    def get(self, key):
+        '''
+        Returns the pixbuf cached for the key, or None if there isn't one.
+        '''
+        group_key = self._keys.get(key)
+
+        if group_key is None:
+            self.misses += 1
+            return None
+
+        group = self._groups[group_key]
+        group.move_to_end(key)
+        self.hits += 1
+
+        return group[key]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def put(self, key, pixbuf, owner=None):
+        '''
+        Caches a pixbuf of the owner for the key, evicting the least recently
+        used ones if its group goes over budget.
+        '''
+        self.remove(key)
+
+        group_key = (owner, pixbuf.get_width())
+
+        if group_key not in self._groups:
+            self._groups[group_key] = collections.OrderedDict()
+            self._used[group_key] = 0
+
+        self._groups[group_key][key] = pixbuf
+        self._used[group_key] += self._pixbuf_size(pixbuf)
+        self._keys[key] = group_key
+
+        self._trim(group_key)
+
+    def remove(self, key):
+        '''
+        Removes the pixbuf cached for the key, if any.
+        '''
+        group_key = self._keys.pop(key, None)
+
+        if group_key is not None:
+            pixbuf = self._groups[group_key].pop(key)
+            self._used[group_key] -= self._pixbuf_size(pixbuf)
+
+    def owned_by(self, owner):
+        '''
+        Returns a view of the cache that puts the pixbufs on the owner's
+        groups, with the same get, put and remove methods.
+        '''
+        return PixbufCacheView(self, owner)
+
+    def stats(self):
+        '''
+        Returns a dict with the cache's counters and its current size.
+        '''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._keys),
+                'bytes': sum(self._used.values())}
+
+    def _pixbuf_size(self, pixbuf):
+        return pixbuf.get_rowstride() * pixbuf.get_height()
+
+    def _trim(self, group_key):
+        group = self._groups.get(group_key)
+
+        if not group:
+            return
+
+        budget = self._budgets.get(group_key, self._default_budget)
+
+        # the most recent pixbuf is always kept, even if it's over budget
+        while self._used[group_key] > budget and len(group) > 1:
+            key, pixbuf = group.popitem(last=False)
+            del self._keys[key]
+            self._used[group_key] -= self._pixbuf_size(pixbuf)
+            self.evictions += 1
+
+
+class PixbufCacheView(object):
+    '''
+    Access to a `PixbufCache` on behalf of one of its owners.
+    '''
+
+    def __init__(self, cache, owner):
+        self._cache = cache
+        self._owner = owner
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def put(self, key, pixbuf):
+        self._cache.put(key, pixbuf, self._owner)
+
+    def remove(self, key):
+        self._cache.remove(key)
+
+
 class Theme:
     '''
     This class manages the theme details